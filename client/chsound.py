@@ -0,0 +1,112 @@
+import numpy as np
+
+
+# OFDMパイロットによるMIMOチャネルサウンダ
+# すべての送信チャネルから同時にパイロットを送信し，シンボル方向の直交符号（DFT系列）で
+# 送信チャネルを分離することで，nRX x nTX x nSCの周波数応答を一度の受信で推定する．
+class ChannelSounder:
+    def __init__(self, usrp, engine, nRep=4, alpha=0.1, txGain=0.1, seed=0):
+        self.usrp = usrp
+        self.engine = engine
+        self.nRep = nRep
+        self.alpha = alpha
+        self.txGain = txGain
+
+        self.nTX = int(np.sum(usrp.nTXUSRPs))
+        self.nRX = int(np.sum(usrp.nRXUSRPs))
+        self.nSYM = self.nTX * nRep
+
+        # 全送信チャネル共通のパイロット（振幅1のQPSK）
+        rng = np.random.default_rng(seed)
+        self.pilot = np.exp(1j * np.pi / 2 * (rng.integers(0, 4, engine.nSC) + 0.5)).astype(np.complex64)
+
+        # 送信チャネルtのシンボルsに乗算する直交符号 W[t, s]
+        t = np.arange(self.nTX)
+        self.cover = np.exp(-2j * np.pi * np.outer(t, t) / self.nTX).astype(np.complex64)
+
+        # 送信チャネルの分離と等化をまとめた係数 (nTX_s, nTX_t, nSC)
+        self._unmix = (np.conj(self.cover).T[:, :, None] / (self.nTX * self.txGain * self.pilot)).astype(np.complex64)
+
+        scs = self.pilot[None, None, :] * np.tile(self.cover, (1, nRep))[:, :, None]
+        self.frame = engine.modulate(scs) * np.float32(txGain)
+
+        self.reset()
+
+
+    def reset(self):
+        self.count = 0
+        self.response = None        # 指数加重平均した周波数応答 (nRX, nTX, nSC)
+        self.sigPower = None        # リンクごとの平均受信電力 (nRX, nTX)
+        self.noisePower = None      # リンクごとの推定雑音電力 (nRX, nTX)
+
+
+    def frameLength(self):
+        return self.frame.shape[-1]
+
+
+    # 各送信コントローラにパイロットを設定して，送受信機の同期をとる
+    def setup(self):
+        idx = 0
+        for i, n in enumerate(self.usrp.nTXUSRPs):
+            self.usrp.transmit(self.frame[idx : idx + n], tidx=i)
+            idx += n
+
+        for i in range(len(self.usrp.rxs)):
+            self.usrp.changeRxAlignSize(self.frameLength(), ridx=i)
+
+        self.usrp.sync()
+
+
+    # 1フレーム分の受信信号 (nRX, frameLength) から周波数応答を推定して平均を更新する
+    def process(self, recv):
+        recv = np.asarray(recv)
+        Y = self.engine.demodulate(recv)                                    # (nRX, nSYM, nSC)
+        Y = Y.reshape(self.nRX, self.nRep, self.nTX, self.engine.nSC)
+
+        # Hrep[r, n, t, k] = sum_s Y[r, n, s, k] * unmix[s, t, k]
+        Hrep = np.einsum("rnsk,stk->rntk", Y, self._unmix, optimize=True)  # (nRX, nRep, nTX, nSC)
+        H = Hrep.mean(axis=1)
+
+        sig = np.mean(np.abs(H)**2, axis=-1)
+        if self.nRep > 1:
+            # 繰り返しごとの推定値のばらつきから雑音電力を求める
+            # 1回分の推定値にはnTXシンボル分の雑音が平均されているので，サブキャリアあたりに戻す
+            var = np.sum(np.abs(Hrep - H[:, None])**2, axis=1) / (self.nRep - 1)
+            noise = np.mean(var, axis=-1) * self.nTX
+        else:
+            noise = np.full(sig.shape, np.nan)
+
+        if self.count == 0:
+            self.response = H.copy()
+            self.sigPower = sig.copy()
+            self.noisePower = noise.copy()
+        else:
+            a = self.alpha
+            self.response += a * (H - self.response)
+            self.sigPower += a * (sig - self.sigPower)
+            self.noisePower += a * (noise - self.noisePower)
+
+        self.count += 1
+        return H
+
+
+    # リンクごとのサブキャリアあたりのSNR [dB] (nRX, nTX)
+    def snr(self):
+        return 10 * np.log10(self.sigPower / self.noisePower)
+
+
+    # 受信と推定を繰り返す
+    # 次の受信要求を先に送っておくことで，推定処理中もサーバ側は受信を進められる
+    def sound(self, ncaptures):
+        nCtrl = len(self.usrp.rxs)
+        for i in range(nCtrl):
+            self.usrp.receive(self.frameLength(), ridx=i, onlyRequest=True)
+
+        for n in range(ncaptures):
+            recv = []
+            for i in range(nCtrl):
+                recv += self.usrp.receive(self.frameLength(), ridx=i, onlyResponse=True)
+                if n + 1 < ncaptures:
+                    self.usrp.receive(self.frameLength(), ridx=i, onlyRequest=True)
+
+            yield self.process(np.vstack([np.asarray(e, dtype=np.complex64) for e in recv]))
@@ -0,0 +1,138 @@
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+import ezsdr
+
+
+# 複数のEz-SDRサーバ（ホスト）をまとめて操作するクライアント
+# コントローラは"host/TX0"のようにホスト名とコントローラ名で指定する．
+# ホストごとの処理はスレッドで並列に行うので，全体の待ち時間はもっとも遅いホストの分だけになる．
+#
+# hosts: {ホスト名: (ipaddr, port, nTXUSRPs, nRXUSRPs)}
+class ClusterClient:
+    def __init__(self, hosts, wireFormat="fc32", timestamps=False):
+        self.hostNames = list(hosts.keys())
+        self.hosts = {}
+        for name, (ipaddr, port, nTXUSRPs, nRXUSRPs) in hosts.items():
+            self.hosts[name] = ezsdr.SimpleClient(ipaddr, port, nTXUSRPs, nRXUSRPs, wireFormat, timestamps)
+
+        self.pool = ThreadPoolExecutor(max_workers=max(len(self.hosts), 1))
+        self.lastLatency = {}       # 直前の並列処理でのホストごとの所要時間 [s]
+
+    def __enter__(self):
+        self.forEachHost(lambda name, c: c.__enter__())
+        return self
+
+    def __exit__(self, *args):
+        self.forEachHost(lambda name, c: c.__exit__(*args))
+        self.pool.shutdown()
+
+    # fn(ホスト名, SimpleClient)をホストごとに並列に実行して，{ホスト名: 戻り値}を返す
+    # 各ホストの所要時間はlastLatencyに入る
+    def forEachHost(self, fn, hostNames=None):
+        if hostNames is None:
+            hostNames = self.hostNames
+
+        def task(name):
+            start = time.perf_counter()
+            ret = fn(name, self.hosts[name])
+            return ret, time.perf_counter() - start
+
+        futures = {name: self.pool.submit(task, name) for name in hostNames}
+        results, latency = {}, {}
+        for name, f in futures.items():
+            results[name], latency[name] = f.result()
+
+        self.lastLatency = latency
+        return results
+
+    # "host/TX0"を(ホスト名, コントローラ名)に分ける
+    @staticmethod
+    def splitAddress(addr):
+        host, sep, target = addr.partition("/")
+        if sep == "" or host == "" or target == "":
+            raise ValueError(f"Invalid address '{addr}'. Please use 'host/TX0'.")
+        return host, target
+
+    def transmitter(self, addr):
+        host, target = self.splitAddress(addr)
+        return next(tx for tx in self.hosts[host].txs if tx.target == target)
+
+    def receiver(self, addr):
+        host, target = self.splitAddress(addr)
+        return next(rx for rx in self.hosts[host].rxs if rx.target == target)
+
+    # すべてのRXコントローラのアドレス（receiveAllの返り値の並び）
+    def rxAddresses(self):
+        return [f"{name}/{rx.target}" for name in self.hostNames for rx in self.hosts[name].rxs]
+
+    def txAddresses(self):
+        return [f"{name}/{tx.target}" for name in self.hostNames for tx in self.hosts[name].txs]
+
+    # アドレスでまとめた{アドレス: 値}をホストごとの{コントローラ名: 値}に分ける
+    def _groupByHost(self, byAddr):
+        grouped = {}
+        for addr, value in byAddr.items():
+            host, target = self.splitAddress(addr)
+            grouped.setdefault(host, {})[target] = value
+        return grouped
+
+    # signals: {"host/TX0": 送信信号, ...}
+    def transmit(self, signals, cache=False):
+        grouped = self._groupByHost(signals)
+        def fn(name, c):
+            for tx in c.txs:
+                if tx.target in grouped[name]:
+                    tx.transmit(grouped[name][tx.target], cache=cache)
+
+        self.forEachHost(fn, list(grouped.keys()))
+
+    def setParamToAllDevice(self, key, value):
+        self.forEachHost(lambda name, c: c.client.setParamToAllDevice(key, value))
+
+    # すべてのホストの送受信ループを止め，次のPPSで時刻を0にしてから，時刻startTimeで一斉に再開する
+    # 各段階はすべてのホストで終わるのを待ってから次に進むので，どのホストも同じPPSで時刻が揃う
+    def sync(self, startTime=1):
+        def stop(name, c):
+            if c.txGroup() is not None:
+                c.txGroup().stopTransmitLoop()
+            if c.rxGroup() is not None:
+                c.rxGroup().stopReceiveLoop()
+
+        def start(name, c):
+            if c.txGroup() is not None:
+                c.txGroup().startTransmitLoop(ezsdr.onTime(startTime))
+            if c.rxGroup() is not None:
+                c.rxGroup().startReceiveLoop(ezsdr.onTime(startTime))
+
+        self.forEachHost(stop)
+        self.setParamToAllDevice("set_time_unknown_pps_to_zero", "[]")
+        self.forEachHost(start)
+
+    # addrs: 受信するRXコントローラのアドレスのリスト
+    # {アドレス: 受信信号のリスト}を返す
+    def receive(self, addrs, nsamples):
+        grouped = self._groupByHost({addr: None for addr in addrs})
+        def fn(name, c):
+            rxs = [rx for rx in c.rxs if rx.target in grouped[name]]
+            # 先にすべての要求を送ってから返答を読む
+            for rx in rxs:
+                rx.receiveRequestOnly(nsamples)
+            return {rx.target: rx.receiveResponseOnly() for rx in rxs}
+
+        results = self.forEachHost(fn, list(grouped.keys()))
+        return {f"{name}/{target}": sigs for name, res in results.items() for target, sigs in res.items()}
+
+    # すべてのホストのすべてのRXコントローラから受信して，(rxAddresses()の数, nChannel, nsamples)の配列で返す
+    # nChannelは全コントローラのうち最大のチャネル数で，チャネル数が少ないコントローラの残りは0になる
+    def receiveAll(self, nsamples):
+        results = self.forEachHost(lambda name, c: c.receiveAll(nsamples))
+        nch = max(r.shape[1] for r in results.values())
+        out = np.zeros((sum(r.shape[0] for r in results.values()), nch, nsamples), dtype=np.complex64)
+        i = 0
+        for name in self.hostNames:
+            r = results[name]
+            out[i : i + r.shape[0], : r.shape[1]] = r
+            i += r.shape[0]
+        return out
@@ -0,0 +1,205 @@
+import queue
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+
+# 共有メモリを名前で開く（Python 3.13以降はこのプロセスのresource trackerに登録しない）
+def _attachSharedMemory(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+# ワーカープロセスの本体
+# tasksから(番号, スロット, meta)を受け取り，fn(スロットのビュー, meta, *args)の戻り値かその例外をresultsに返す
+def _workerMain(shmName, slotShape, dtype, numSlots, fn, args, tasks, results):
+    shm = _attachSharedMemory(shmName)
+    try:
+        slots = np.ndarray((numSlots,) + slotShape, dtype=dtype, buffer=shm.buf)
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+
+            seq, slot, meta = task
+            view = slots[slot]
+            view.flags.writeable = False
+            try:
+                results.put((seq, slot, True, fn(view, meta, *args)))
+            except Exception as ex:
+                results.put((seq, slot, False, ex))
+            finally:
+                view = None
+        del slots
+    finally:
+        shm.close()
+
+
+# 受信信号の処理（相関，OFDMの復調，EVMなど）を複数のプロセスで並列に行うプール
+# 受信信号はnumSlots個のスロットに分けた共有メモリに直接受信させ，ワーカーはそのスロットをコピーせずに読む
+# 処理を終えたスロットから再利用するので，すべてのスロットが処理待ちのときは受信側がacquireで待たされる
+# 結果はsubmitした順（受信した順）に返す
+#
+# fn(signals, meta, *args)はワーカープロセスで呼ばれ，signalsは(nbuf, nsamples)の読み込み専用のビュー
+# fnの戻り値はプロセス間で受け渡すのでpickleできるものにし，signalsを参照する配列はコピーして返す
+# start methodがforkでない場合（spawnやforkserver）は，fnをモジュールのトップレベルで定義する
+#
+#   with dsppool.DSPWorkerPool(evm, (1, nsamples)) as pool:
+#       for r in pool.receiveLoop(usrp.rxs[0], nsamples, 1000):
+#           ...
+class DSPWorkerPool:
+    def __init__(self, fn, shape, numWorkers=None, numSlots=None, dtype=np.complex64, args=(), startMethod=None):
+        self.numWorkers = numWorkers if numWorkers is not None else mp.cpu_count()
+        self.numSlots = numSlots if numSlots is not None else 2 * self.numWorkers
+        self.slotShape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+        nbytes = int(np.prod(self.slotShape)) * self.dtype.itemsize * self.numSlots
+        self._shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        self.slots = np.ndarray((self.numSlots,) + self.slotShape, dtype=self.dtype, buffer=self._shm.buf)
+
+        ctx = mp.get_context(startMethod)
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._workers = [
+            ctx.Process(target=_workerMain, daemon=True,
+                        args=(self._shm.name, self.slotShape, self.dtype, self.numSlots, fn, tuple(args), self._tasks, self._results))
+            for _ in range(self.numWorkers)
+        ]
+        for w in self._workers:
+            w.start()
+
+        self._free = queue.Queue()
+        for i in range(self.numSlots):
+            self._free.put(i)
+
+        self._cond = threading.Condition()
+        self._done = {}             # {番号: (成功したか, 戻り値か例外)}
+        self._nextSeq = 0           # 次にsubmitする番号
+        self._nextYield = 0         # 次に返す結果の番号
+        self.numWaits = 0           # acquireでスロットが空くのを待った回数
+        self._closed = False
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # ワーカーから届いた結果を覚えて，スロットを空ける
+    def _collect(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                return
+
+            seq, slot, ok, value = item
+            with self._cond:
+                self._done[seq] = (ok, value)
+                self._cond.notify_all()
+            self._free.put(slot)
+
+    # 空いているスロットを(番号, (nbuf, nsamples)のビュー)で返す．すべて使用中なら空くまで待つ
+    def acquire(self, timeout=None):
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            self.numWaits += 1
+            slot = self._free.get(timeout=timeout)
+        return slot, self.slots[slot]
+
+    # 書き込み終えたスロットの処理を依頼して，結果の番号を返す．metaはfnにそのまま渡される
+    def submit(self, slot, meta=None):
+        seq = self._nextSeq
+        self._nextSeq += 1
+        self._tasks.put((seq, slot, meta))
+        return seq
+
+    # 処理待ちと処理中のスロットの数
+    def numPending(self):
+        return self.numSlots - self._free.qsize()
+
+    # submitした順に，次の結果が届いていればそれを返す
+    # 届いていなければ，waitなら届くまで待ち，そうでなければNoneを返す（結果がNoneの場合と区別するため(結果,)で返す）
+    def _popNext(self, wait):
+        with self._cond:
+            if wait:
+                self._cond.wait_for(lambda: self._nextYield in self._done)
+            elif self._nextYield not in self._done:
+                return None
+
+            ok, value = self._done.pop(self._nextYield)
+            self._nextYield += 1
+
+        if not ok:
+            raise value
+        return (value,)
+
+    # これまでにsubmitしたもののうち，順番が来ていて処理し終えた結果を返すイテレータ（待たない）
+    def readyResults(self):
+        while self._nextYield < self._nextSeq:
+            r = self._popNext(False)
+            if r is None:
+                return
+            yield r[0]
+
+    # これまでにsubmitしたものの結果をすべて順に返すイテレータ
+    def results(self):
+        while self._nextYield < self._nextSeq:
+            yield self._popNext(True)[0]
+
+    # capture(view)で空いているスロットに書き込んでは処理を依頼することをnumCaptures回（Noneなら止めるまで）繰り返し，
+    # 結果を受信した順に返すイテレータ．captureの戻り値はmetaとしてfnに渡る
+    # スロットがすべて処理待ちになると，空くまで次のcaptureを待つ
+    def run(self, capture, numCaptures=None):
+        k = 0
+        while numCaptures is None or k < numCaptures:
+            slot, view = self.acquire()
+            try:
+                meta = capture(view)
+            except BaseException:
+                self._free.put(slot)
+                raise
+            self.submit(slot, meta)
+            k += 1
+            yield from self.readyResults()
+
+        yield from self.results()
+
+    # rx（CyclicReceiver）でnsamplesずつ受信してはfnで処理し，結果を受信した順に返す
+    # 受信信号はスロットに直接書き込まれるので，プール側でのコピーはない
+    # metaには受信したサンプル数（timeoutで打ち切られた場合は短くなる）が入る
+    def receiveLoop(self, rx, nsamples, numCaptures=None, qs=b'', timeout=None):
+        assert nsamples <= self.slotShape[-1]
+
+        def capture(view):
+            try:
+                rx.receive(nsamples, qs=qs, out=view, timeout=timeout)
+            except TimeoutError:
+                pass
+            return rx.lastNumSamples
+
+        return self.run(capture, numCaptures)
+
+    # ワーカーを止めて共有メモリを解放する．処理中のものは終わるのを待つ
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+
+        for _ in self._workers:
+            self._tasks.put(None)
+        for w in self._workers:
+            w.join()
+
+        self._results.put(None)
+        self._collector.join()
+
+        self.slots = None
+        self._shm.close()
+        self._shm.unlink()
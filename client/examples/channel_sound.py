@@ -0,0 +1,28 @@
+import sys
+sys.path.append("..")
+
+import ezsdr
+import ofdm
+import chsound
+import numpy as np
+
+# サーバーIPとポート番号
+IPADDR = "127.0.0.1";
+PORT = 8888;
+
+nTXUSRPs = [1, 1]       # 送信コントローラ2個，各1チャネル
+nRXUSRPs = [1, 1]       # 受信コントローラ2個，各1チャネル
+
+nSC = 256
+nFFT = nSC * 4
+nCP = nFFT // 4
+
+with ezsdr.SimpleClient(IPADDR, PORT, nTXUSRPs, nRXUSRPs) as usrp:
+    sounder = chsound.ChannelSounder(usrp, ofdm.OFDM(nFFT, nSC, nCP), nRep=8, alpha=0.05)
+    sounder.setup()
+
+    for i, H in enumerate(sounder.sound(1000)):
+        if i % 100 == 0:
+            print("{}th: SNR [dB] =\n{}".format(i, sounder.snr()))
+
+    np.save("channel_response.npy", sounder.response)
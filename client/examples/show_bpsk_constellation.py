@@ -2,11 +2,11 @@ import sys
 sys.path.append("..")
 
 import ezsdr
+import pulseshape
 import numpy as np
 import time
 import matplotlib.pyplot as plt
 from matplotlib import animation
-from scipy import signal
 
 # サーバーIPとポート番号
 IPADDR = "127.0.0.1";
@@ -21,27 +21,11 @@ bpsk_constellation = np.array([1+0j, -1+0j])
 # qpsk_constellation = np.array([1+1j, -1+1j, -1-1j, 1-1j]) / np.sqrt(2)
 
 
-def make_rrc_filter(Ntaps, Nos, beta):
-    ts = np.linspace(-Ntaps/2, Ntaps/2-1, Ntaps)
-    ps = ts / Nos
-    hs = np.sin(np.pi * ps * (1 - beta)) + 4 * beta * ps * np.cos(np.pi * ps * (1 + beta))
-    hs = hs / Nos / (np.pi * ps * (1 - (4 * beta * ps)**2))
-    hs[Ntaps//2] = 1 / Nos * (1 + beta * (4 / np.pi - 1))
-    hs[np.abs(ts)==(Nos / 4 / beta)] = beta / Nos / np.sqrt(2) * ((1 + 2/np.pi) * np.sin(np.pi/(4*beta)) + (1 - 2/np.pi) * np.cos(np.pi/(4*beta)))
-    return hs
-
-
 with ezsdr.SimpleClient(IPADDR, PORT, nTXUSRP, nRXUSRP) as usrp:
 
+    # ループ送信するので巡回畳み込みでRRCフィルタをかける
     signals = [
-        np.repeat(np.random.choice(bpsk_constellation, nSamples//8), 8) * 0.1,
-    ]
-
-    rrcImpResp = make_rrc_filter(16, 8, 0.5)
-    print(rrcImpResp)
-
-    signals = [
-        signal.lfilter(rrcImpResp, 1, signals[0])
+        pulseshape.pulseShape(np.random.choice(bpsk_constellation, nSamples//8) * 0.1, 8, beta=0.5, Ntaps=16, cyclic=True),
     ]
 
     usrp.changeRxAlignSize(nSamples)
@@ -0,0 +1,40 @@
+import sys
+sys.path.append("..")
+
+import ezsdr
+import ofdm
+import numpy as np
+
+# サーバーIPとポート番号
+IPADDR = "127.0.0.1";
+PORT = 8888;
+
+qpsk_constellation = np.array([1+1j, -1+1j, -1-1j, 1-1j]) / np.sqrt(2)
+
+nOS = 4                 # OFDMのオーバーサンプリング率
+nSC = 256               # OFDMの有効サブキャリア数
+nFFT = nSC * nOS        # OFDM変調のFFTサイズ
+nCP = nFFT//4           # CPのサイズ
+nTxSYM = 100            # 1回の送受信で伝送するシンボル数
+
+engine = ofdm.OFDM(nFFT, nSC, nCP)
+
+with ezsdr.SimpleClient(IPADDR, PORT, 1, 1) as usrp:
+    subcarriers = np.random.choice(qpsk_constellation, (1, nTxSYM, nSC))
+    modulated = engine.modulate(subcarriers) * 0.1
+
+    usrp.changeRxAlignSize(modulated.shape[-1])
+    usrp.transmit(modulated)
+    usrp.sync()
+
+    # チャネル推定
+    recv = np.array(usrp.receive(modulated.shape[-1]))
+    channel_resp = np.mean(engine.demodulate(recv) / subcarriers, axis=-2)
+
+    # 任意長のチャンクを逐次復調する
+    demod = engine.streamDemodulator(nChannel=1)
+    nChunk = 10000
+    for i in range(100):
+        recv = np.array(usrp.receive(nChunk))
+        scs = demod.push(recv) / channel_resp[:, None, :]
+        print("{}th: {} symbols".format(i, scs.shape[1]))
@@ -1,23 +1,42 @@
 import socket
+import time
+import hashlib
+import json
+import os
+import re
+import threading
 import numpy as np
 import scipy
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import sigdatafmt
 import matplotlib.pyplot as plt
 import multiprocessing as mp
 
 
 
+SessionInfo = namedtuple("SessionInfo", ["sessionId", "numSessions"])
+
+
 class EzSDRClient:
+    # ipaddrに"unix:///path/to/socket"を渡すと，Unixドメインソケットで接続する（portは使わない）
     def __init__(self, ipaddr, port):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.ipaddr = ipaddr
         self.port = port
+        self.paramCache = None      # params.DeviceParamCacheを作ると設定される
+        self.numPendingResponses = 0    # 要求だけを送って，まだ読んでいない返答の数
+        self.sessionId = None           # sessionInfoで読んだこの接続のセッションID
+        if ipaddr is not None and ipaddr.startswith("unix://"):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.address = ipaddr[len("unix://"):]
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.address = (ipaddr, port)
 
     def __enter__(self):
         if self.ipaddr is not None:
             self.sock.__enter__();
-            self.sock.connect((self.ipaddr, self.port))
+            self.sock.connect(self.address)
         return self
 
     def __exit__(self, *args):
@@ -27,13 +46,37 @@ class EzSDRClient:
 
     def connect(self):
         if self.ipaddr is not None:
-            self.sock.connect((self.ipaddr, self.port))
+            self.sock.connect(self.address)
+
+    # 要求だけを送って返答を後で読む場合に，読むべき返答がn個増えたことを記録する
+    def expectResponses(self, n=1):
+        self.numPendingResponses += n
+
+    def responseRead(self):
+        if self.numPendingResponses > 0:
+            self.numPendingResponses -= 1
+
+    # 返答は要求の順に届くので，先に送った要求の返答が残っているうちに返答をすぐ読むと，それを自分の返答として読んでしまう
+    def ensureNoPendingResponses(self, name):
+        if self.numPendingResponses != 0:
+            raise RuntimeError(f"{name} reads its reply immediately, but {self.numPendingResponses} responses to earlier requests have not been read")
 
     def sendMsg(self, target, msg):
         sigdatafmt.writeStringToSock(self.sock, target)
         sigdatafmt.writeIntToSock(self.sock, len(msg), np.uint64)
         self.sock.sendall(msg)
 
+    # sendMsgで送るのと同じバイト列を返す（複数のメッセージをまとめて送るときに使う）
+    @staticmethod
+    def frameMsg(target, msg):
+        return EzSDRClient.frameHeader(target, len(msg)) + msg
+
+    # 長さmsglenのメッセージの前に付ける[u16 taglen][tag][u64 msglen]
+    @staticmethod
+    def frameHeader(target, msglen):
+        bs = target.encode(encoding="utf-8")
+        return sigdatafmt.valueToBytes(len(bs), np.uint16) + bs + sigdatafmt.valueToBytes(msglen, np.uint64)
+
     def resumeController(self, target):
         msg = sigdatafmt.valueToBytes(0b00000001, np.uint8)
         msg += sigdatafmt.valueToBytes(len(target), np.uint64)
@@ -54,16 +97,129 @@ class EzSDRClient:
         msg = sigdatafmt.valueToBytes(0b00000100, np.uint8)
         self.sendMsg("@server", msg)
 
-    def setParamToDevice(self, target, key, value):
+    # この接続のセッションIDと，サーバに接続しているセッション数を返す
+    # サーバは接続ごとにセッションを作るので，複数のプロセスから同じサーバを使える
+    def sessionInfo(self):
+        self.ensureNoPendingResponses("sessionInfo")
+        self.sendMsg("@server", sigdatafmt.valueToBytes(0b00000101, np.uint8))
+        sessionId, numSessions = np.frombuffer(sigdatafmt.readBytesFromSock(self.sock, 16), dtype=np.uint64)
+        self.sessionId = int(sessionId)
+        return SessionInfo(int(sessionId), int(numSessions))
+
+    # コントローラtargetが処理中の受信命令を打ち切る．打ち切る命令がなければFalseを返す
+    # 打ち切られる命令を送った接続はその返答を待っているので，これは別の接続から呼ぶ
+    # sessionIdに命令を送った接続のセッションIDを渡すと，他の接続が送った命令は打ち切らない
+    def cancelRequest(self, target, sessionId=None):
+        self.ensureNoPendingResponses("cancelRequest")
+        bs = target.encode(encoding="utf-8")
+        msg = sigdatafmt.valueToBytes(0b00000111, np.uint8)
+        msg += sigdatafmt.valueToBytes(len(bs), np.uint64) + bs
+        if sessionId is not None:
+            msg += sigdatafmt.valueToBytes(sessionId, np.uint64)
+        self.sendMsg("@server", msg)
+        return sigdatafmt.readBytesFromSock(self.sock, 1)[0] != 0
+
+    # サーバの統計を辞書で返す
+    # uptime [s]，取りこぼした受信サンプル数，デバイススレッドのタスクの滞留数，メッセージバッファやGCの使用量と，
+    # "targets"に宛先ごとのメッセージ数，入出力のバイト数，処理時間のヒストグラム（stats.latencyPercentileで読む）が入る
+    # 値は起動からの累計なので，変化を見るにはstats.ServerStatsPollerで定期的に取得する
+    def serverStats(self):
+        self.ensureNoPendingResponses("serverStats")
+        self.sendMsg("@server", sigdatafmt.valueToBytes(0b00000110, np.uint8))
+        n = int(np.frombuffer(sigdatafmt.readBytesFromSock(self.sock, 8), dtype=np.uint64)[0])
+        return json.loads(bytes(sigdatafmt.readBytesFromSock(self.sock, n)).decode(encoding="utf-8"))
+
+    def setParamToDevice(self, target, key, value, qs=b''):
+        if self.paramCache is not None:
+            # "@alldevs"やパターンで送った場合は，どのデバイスの値が変わったかわからない
+            self.paramCache.invalidate(None if target.startswith(("@", "/")) else target, key)
+        return self.sendMsg(target, self.setParamMsg(key, value, qs))
+
+    # デバイスのパラメータを文字列で返す
+    # デバイスが読み出せないkeyならKeyErrorを投げる
+    def getParamFromDevice(self, target, key):
+        self.ensureNoPendingResponses("getParamFromDevice")
+        self.sendMsg(target, self.getParamMsg(key))
+        value = self.readParamResponse()
+        if value is None:
+            raise KeyError(f"device '{target}' cannot read parameter '{key}'")
+        return value
+
+    @staticmethod
+    def getParamMsg(key):
+        bs = key.encode(encoding="utf-8")
+        return sigdatafmt.valueToBytes(0b00000001, np.uint8) + sigdatafmt.valueToBytes(len(bs), np.uint64) + bs
+
+    # 値はJSONなので空にはならない．長さ0の返答はデバイスが読み出せないkeyを表し，Noneを返す
+    def readParamResponse(self):
+        n = int(np.frombuffer(sigdatafmt.readBytesFromSock(self.sock, 8), dtype=np.uint64)[0])
+        if n == 0:
+            return None
+        return bytes(sigdatafmt.readBytesFromSock(self.sock, n)).decode(encoding="utf-8")
+
+    # 名前がpatternに一致するコントローラ（一致するものがなければデバイス）をまとめて操作するTargetGroupを返す
+    # patternは"RX*"のようなglobで，regex=Trueなら正規表現として名前全体に一致させる
+    def group(self, pattern, regex=False):
+        return TargetGroup(self, "/" + (pattern if regex else globToRegex(pattern)))
+
+    # 名前がpattern（正規表現）に完全一致するコントローラとデバイスの数を返す
+    def countMatchedTargets(self, pattern):
+        self.ensureNoPendingResponses("countMatchedTargets")
+        bs = pattern.encode(encoding="utf-8")
+        msg = sigdatafmt.valueToBytes(0b00001000, np.uint8)
+        msg += sigdatafmt.valueToBytes(len(bs), np.uint64) + bs
+        self.sendMsg("@server", msg)
+        ok = sigdatafmt.readUInt8FromSock(self.sock)
+        nctrl, ndev = np.frombuffer(sigdatafmt.readBytesFromSock(self.sock, 16), dtype=np.uint64)
+        if ok != 1:
+            raise ValueError(f"Invalid target pattern '{pattern}'")
+        return int(nctrl), int(ndev)
+
+    def setParamToAllDevice(self, key, value, qs=b''):
+        self.setParamToDevice("@alldevs", key, value, qs)
+
+    # qsにonTimeなどの追加情報を渡すと，デバイスのsetParamにそのまま渡される
+    @staticmethod
+    def setParamMsg(key, value, qs=b''):
         msg = sigdatafmt.valueToBytes(0b00000000, np.uint8)
         msg += sigdatafmt.valueToBytes(len(key), np.uint64)
         msg += key.encode(encoding="utf-8")
         msg += sigdatafmt.valueToBytes(len(value), np.uint64)
         msg += value.encode(encoding="utf-8")
-        return self.sendMsg(target, msg)
+        if len(qs) != 0:
+            msg += sigdatafmt.valueToBytes(len(qs), np.uint64) + qs
+        return msg
+
 
-    def setParamToAllDevice(self, key, value):
-        self.setParamToDevice("@alldevs", key, value)
+# "*"と"?"だけを特別扱いするglobを正規表現にする
+def globToRegex(pattern):
+    return "".join(".*" if c == "*" else "." if c == "?" else re.escape(c) for c in pattern)
+
+
+# 名前がパターンに一致するコントローラ（なければデバイス）に1つのメッセージでまとめて送るプロキシ
+# CyclicTransmitterとCyclicReceiverのメソッドを呼べるが，返答のあるメソッドでは
+# コントローラ名の辞書順に各コントローラの返答が続くので，一致した数（numTargets）だけ返答を読む必要がある
+# サーバはパターンごとに一致する名前を覚えておくので，同じパターンを何度使ってもよい
+# 作るときに一致する数をサーバに問い合わせるので，パターンが不正ならValueErrorになる
+class TargetGroup:
+    def __init__(self, client, target):
+        self.client = client
+        self.target = target
+        nctrl, ndev = client.countMatchedTargets(target[1:])
+        self.numTargets = nctrl if nctrl != 0 else ndev
+        self._proxies = [CyclicTransmitter(client, target), CyclicReceiver(client, target)]
+        for proxy in self._proxies:
+            proxy.numTargets = self.numTargets
+
+    # 一致するデバイスにパラメータを設定する
+    def setParam(self, key, value, qs=b''):
+        self.client.setParamToDevice(self.target, key, value, qs)
+
+    def __getattr__(self, name):
+        for proxy in self.__dict__.get("_proxies", []):
+            if hasattr(type(proxy), name):
+                return getattr(proxy, name)
+        raise AttributeError(name)
 
 
 def onTime(t):
@@ -73,21 +229,308 @@ def onTime(t):
     return sigdatafmt.valueToBytes(len(msg), np.uint64) + sigdatafmt.valueToBytes(tag, np.uint32) + msg
 
 
+# 追加情報（[u64 size][u32 tag][data]の並び）を(tag, data)の組に分ける
+def parseOptArgs(bin):
+    pos = 0
+    while len(bin) - pos >= 12:
+        size = int(np.frombuffer(bin, dtype=np.uint64, count=1, offset=pos)[0])
+        tag = int(np.frombuffer(bin, dtype=np.uint32, count=1, offset=pos + 8)[0])
+        yield tag, bin[pos + 12 : pos + 12 + size]
+        pos += 12 + size
+
+
+RECEIVE_TIME_INFO_TAG = 0x5C45D2C7      # crc32("ReceiveTimeInfo")
+SAMPLE_INDEX_INFO_TAG = 0x4ABD085D      # crc32("SampleIndexInfo")
+
+# 受信信号の先頭サンプルの情報
+# timeNSec: デバイス時刻 [ns]（デバイスが時刻を返さない場合はNone）, sampleIndex: ループ受信を開始してからのサンプル番号
+ReceiveMetadata = namedtuple("ReceiveMetadata", ["timeNSec", "sampleIndex"])
+
+
+def parseReceiveMetadata(bin):
+    timeNSec, sampleIndex = None, None
+    for tag, data in parseOptArgs(bin):
+        if tag == RECEIVE_TIME_INFO_TAG:
+            timeNSec = int(np.frombuffer(data, dtype=np.uint64)[0])
+        elif tag == SAMPLE_INDEX_INFO_TAG:
+            sampleIndex = int(np.frombuffer(data, dtype=np.int64)[0])
+    return ReceiveMetadata(timeNSec, sampleIndex)
+
+
+# 受信信号にReceiveMetadataを付けたもの（.metaで参照する）
+class ReceivedSignal(np.ndarray):
+    def __array_finalize__(self, obj):
+        self.meta = getattr(obj, "meta", None)
+
+
+# 時刻付きで受信した信号（異なるRXコントローラのものでもよい）の先頭を揃えるためのオフセットを返す
+# signal[offset:]とすれば，すべての信号の先頭が同じ時刻のサンプルになる
+def alignmentOffsets(metas, sampleRate):
+    times = [m.timeNSec for m in metas]
+    if any(t is None for t in times):
+        raise ValueError("Some buffers have no device time")
+
+    latest = max(times)
+    return [int(round((latest - t) * sampleRate / 1e9)) for t in times]
+
+
+# 送信信号のハッシュ値（サーバ側のキャッシュのキーになる16バイト）
+def waveformHash(signal):
+    data = np.ascontiguousarray(signal, dtype=np.complex64)
+    return hashlib.blake2b(data.view(np.uint8), digest_size=16).digest()
+
+
+# 電力トリガ付き受信の結果
+# signals: 各チャネルの受信信号, triggered: デバイススレッドごとにトリガがかかったか,
+# sampleIndex: デバイススレッドごとの信号の先頭のサンプル番号（ループ受信を開始してからのサンプル数）
+TriggeredCapture = namedtuple("TriggeredCapture", ["signals", "triggered", "sampleIndex"])
+
+# PSDの計算に使える窓関数
+PSD_WINDOWS = {"rectangular": 0, "hann": 1, "hamming": 2, "blackman": 3}
+
+# パワースペクトルの受信結果
+# average: (nch, nfft)のfloat32で1ビンあたりの平均電力, maxHold: 同じ形の最大値（max-holdしないときはNone）
+# ビンの並びはFFTの出力順（DCが先頭）なので，表示するときはnp.fft.fftshiftする
+PSDFrame = namedtuple("PSDFrame", ["average", "maxHold"])
+
+
+# seq: ブロック番号（先頭サンプルの番号 / block）, dropped: サーバがこれまでにキューから捨てたブロックの数
+# signals: (nbuf, block)のcomplex64の配列
+SubscribedBlock = namedtuple("SubscribedBlock", ["seq", "dropped", "signals"])
+
+# offset: チャンクの先頭のサンプル位置, lost: このチャンクの直前にサーバが取りこぼしたサンプル数
+# signals: (nbuf, チャンク長)のcomplex64の配列
+ReceivedChunk = namedtuple("ReceivedChunk", ["offset", "lost", "signals"])
+
+# 分割して返答する受信命令が打ち切られたときに，取りこぼしたサンプル数の代わりに届く値
+CANCELLED_CHUNK_MARKER = 2**64 - 1
+
+
+# receiveのtimeoutまでに受信し終えなかった
+# signalsには打ち切るまでに受信した分（全バッファで同じ長さ）が入る
+class ReceiveTimeout(TimeoutError):
+    def __init__(self, signals):
+        super().__init__("The receive request was cancelled by timeout")
+        self.signals = signals
+
+SUBSCRIBE_DROP_POLICIES = {"oldest": 0, "newest": 1}
+SUBSCRIBED_BLOCK_HEADER = np.dtype([("seq", "<i8"), ("dropped", "<u8"), ("nbuf", "<u8")])
+
+
+# サーバが受信信号を直接書き込む共有メモリ
+# サーバはリングバッファとして先頭から順に書き込み，末尾に収まらなければ先頭に戻るので，
+# 受け取った信号のビューはsize バイト分の受信が続くまでしか有効ではない．
+# 使い終えたら，closeの前にCyclicReceiver.releaseSharedでサーバ側のマップを解放させる
+class SharedMemoryRing:
+    def __init__(self, size):
+        from multiprocessing import shared_memory
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+
+    # サーバがshm_openに使う名前
+    def serverName(self):
+        return "/" + self.shm.name
+
+    def view(self, offset, nsamples):
+        return np.ndarray((nsamples,), dtype=np.complex64, buffer=self.shm.buf, offset=offset)
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 class CyclicTransmitter:
-    def __init__(self, client, target):
+    # サーバに登録したと思われるハッシュ値の組をいくつまで覚えておくか
+    maxHashHints = 64
+
+    # 回線速度の見積もりに使う送信の最小サイズ [bytes]
+    minTimedUploadBytes = 2**20
+
+    # wireFormat: 信号を送る形式（"fc32", "sc16", "sc8"）
+    # compression: None（圧縮しない）, "on"（常に圧縮する）, "auto"（回線速度と圧縮率から速くなる場合だけ圧縮する）
+    # 圧縮した信号はsc16の精度に量子化される
+    def __init__(self, client, target, wireFormat="fc32", compression=None, compressionBlockLen=2**18):
         self.client = client
         self.target = target
+        self.wireFormat = wireFormat
+        self.compression = compression
+        self.compressionBlockLen = compressionBlockLen
+        self.linkBytesPerSec = None     # これまでの送信から見積もった回線速度 [bytes/s]
+        self.lastCompressionRatio = None
+        self.numTargets = 1             # 返答を返すコントローラの数（TargetGroupでは一致した数）
+        self._hashHints = OrderedDict()
 
     def sendMsgWQ(self, msg, qs):
         self.client.sendMsg(self.target, sigdatafmt.valueToBytes(len(qs), np.uint64) + qs + msg)
 
     def setTransmitSignal(self, signals, qs=b''):
-        msg = sigdatafmt.valueToBytes(0b00010000, np.uint8)
-        for i in range(len(signals)):
-            msg += sigdatafmt.valueToBytes(len(signals[i]), np.uint64)
-            msg += sigdatafmt.arrayToBytes(signals, np.complex64)
-        
+        if self.compression is not None and not any(isinstance(s, tuple) for s in signals):
+            scale = sigdatafmt.autoScale(signals, "sc16")
+            if self.compression == "on" or self._compressionPays(signals, scale):
+                return self.setTransmitSignalCompressed(signals, scale, qs=qs)
+
+        if self.wireFormat != "fc32":
+            return self.setTransmitSignalWithFormat(signals, self.wireFormat, qs=qs)
+
+        nbytes = sum(8 * (s[0] if isinstance(s, tuple) else len(s)) for s in signals)
+        self._timedUpload(nbytes, lambda: self.setTransmitSignalStreaming(signals, qs))
+
+    # 信号をblockLenサンプルごとに圧縮して送る．サーバはブロックを並列に展開して送信バッファに書き込む
+    # scaleを省略すると，全チャネルのピークがint16の最大値になるように決める
+    def setTransmitSignalCompressed(self, signals, scale=0, blockLen=None, level=1, qs=b''):
+        if scale == 0:
+            scale = sigdatafmt.autoScale(signals, "sc16")
+        if blockLen is None:
+            blockLen = self.compressionBlockLen
+
+        msg = sigdatafmt.valueToBytes(0b00011000, np.uint8)
+        msg += sigdatafmt.valueToBytes(sigdatafmt.WIRE_CODECS["zlib-sc16"], np.uint8)
+        msg += sigdatafmt.valueToBytes(scale, np.float32)
+        msg += sigdatafmt.valueToBytes(blockLen, np.uint64)
+        parts = [msg]
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+            for s in signals:
+                parts.append(sigdatafmt.valueToBytes(len(s), np.uint64))
+                for b in sigdatafmt.compressBlocks(s, scale, blockLen, level, pool):
+                    parts.append(sigdatafmt.valueToBytes(len(b), np.uint64))
+                    parts.append(b)
+
+        msg = b"".join(parts)
+        rawBytes = 8 * sum(len(s) for s in signals)
+        self.lastCompressionRatio = rawBytes / len(msg) if len(msg) != 0 else None
+        self._timedUpload(len(msg), lambda: self.sendMsgWQ(msg, qs))
+
+    # 先頭のブロックを試しに圧縮して圧縮率と圧縮速度を測り，圧縮したほうが早く送り終わるかを返す
+    # 回線速度がまだわからなければ，2倍以上に圧縮できるなら圧縮する
+    def _compressionPays(self, signals, scale):
+        rawBytes = 8 * sum(len(s) for s in signals)
+        if rawBytes < self.minTimedUploadBytes:
+            return False
+
+        sample = np.asarray(signals[0][: self.compressionBlockLen])
+        start = time.perf_counter()
+        block = sigdatafmt.compressBlocks(sample, scale, len(sample))[0]
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        ratio = 8 * len(sample) / len(block)
+
+        if self.linkBytesPerSec is None:
+            return ratio >= 2
+
+        compressBytesPerSec = 8 * len(sample) / elapsed * (os.cpu_count() or 1)
+        rawTime = rawBytes / self.linkBytesPerSec
+        compressedTime = rawBytes / compressBytesPerSec + rawBytes / ratio / self.linkBytesPerSec
+        return compressedTime < rawTime
+
+    # 送信にかかった時間から回線速度の見積もりを更新する
+    def _timedUpload(self, nbytes, send):
+        start = time.perf_counter()
+        send()
+        elapsed = time.perf_counter() - start
+        if nbytes >= self.minTimedUploadBytes and elapsed > 0:
+            rate = nbytes / elapsed
+            self.linkBytesPerSec = rate if self.linkBytesPerSec is None else 0.5 * (self.linkBytesPerSec + rate)
+
+    # メッセージ全体を作らずに，チャネルごとの信号をchunkサンプルずつソケットに書き込んで送信信号を設定する
+    # signalsの各要素には配列（np.memmapも可）か，(サンプル数, complex64の配列を順に返すイテレータ)の組を渡せる
+    # サーバも送信バッファに直接読み込むので，メモリに収まらない長さの信号でも送れる
+    def setTransmitSignalStreaming(self, signals, qs=b'', chunk=2**20):
+        lengths = [s[0] if isinstance(s, tuple) else len(s) for s in signals]
+        head = sigdatafmt.valueToBytes(len(qs), np.uint64) + qs + sigdatafmt.valueToBytes(0b00010000, np.uint8)
+        msglen = len(head) + sum(8 + 8 * n for n in lengths)
+
+        sock = self.client.sock
+        sock.sendall(EzSDRClient.frameHeader(self.target, msglen) + head)
+        for s, n in zip(signals, lengths):
+            sock.sendall(sigdatafmt.valueToBytes(n, np.uint64))
+            parts = s[1] if isinstance(s, tuple) else (s[k : k + chunk] for k in range(0, n, chunk))
+            nsent = 0
+            for part in parts:
+                part = np.ascontiguousarray(part, dtype=np.complex64)
+                sock.sendall(memoryview(part).cast("B"))
+                nsent += len(part)
+            if nsent != n:
+                raise ValueError(f"The signal has {nsent} samples but {n} samples were declared.")
+
+    # 量子化した形式で送信信号を送る
+    # scaleを省略すると，全チャネルのピークが整数の最大値になるように決める
+    def setTransmitSignalWithFormat(self, signals, wireFormat, scale=0, qs=b''):
+        if scale == 0:
+            scale = sigdatafmt.autoScale(signals, wireFormat)
+
+        msg = sigdatafmt.valueToBytes(0b00010111, np.uint8)
+        msg += sigdatafmt.valueToBytes(sigdatafmt.wireFormatId(wireFormat), np.uint8)
+        msg += sigdatafmt.valueToBytes(scale, np.float32)
+        for s in signals:
+            msg += sigdatafmt.valueToBytes(len(s), np.uint64)
+            msg += sigdatafmt.encodeSignal(s, wireFormat, scale)[1]
+
+        self.sendMsgWQ(msg, qs)
+
+    # channel番目の送信信号の[offset, offset + len(signal))をsignalで書き換える
+    # デバイスが対応していればループ送信を止めずに書き換わる
+    # 書き換えられなかった場合（範囲外や，信号がデバイス側にしかなく書き換えられない場合）はFalseを返す
+    # 返答をすぐに読むので，receiveRequestOnlyなどで返答を読んでいない要求があるときは呼べない
+    def patchTransmitSignal(self, channel, offset, signal, qs=b''):
+        self.client.ensureNoPendingResponses("patchTransmitSignal")
+        msg = sigdatafmt.valueToBytes(0b00010110, np.uint8)
+        msg += sigdatafmt.valueToBytes(channel, np.uint64)
+        msg += sigdatafmt.valueToBytes(offset, np.uint64)
+        msg += sigdatafmt.valueToBytes(len(signal), np.uint64)
+        msg += sigdatafmt.arrayToBytes(signal, np.complex64)
         self.sendMsgWQ(msg, qs)
+        return all(e != 0 for e in sigdatafmt.readBytesFromSock(self.client.sock, self.numTargets))
+
+    # サーバのキャッシュにある信号をハッシュ値で指定して設定する
+    # 一つでもキャッシュになければ何も変更せずにFalseを返す
+    # 返答をすぐに読むので，receiveRequestOnlyなどで返答を読んでいない要求があるときは呼べない
+    def setTransmitSignalByHash(self, hashes, qs=b''):
+        self.client.ensureNoPendingResponses("setTransmitSignalByHash")
+        msg = sigdatafmt.valueToBytes(0b00010100, np.uint8)
+        for h in hashes:
+            msg += h
+
+        self.sendMsgWQ(msg, qs)
+        return all(e == 1 for e in sigdatafmt.readBytesFromSock(self.client.sock, self.numTargets))
+
+    # 信号を設定し，以降はハッシュ値で指定できるようにサーバのキャッシュに登録する
+    def setTransmitSignalWithHash(self, signals, hashes=None, qs=b''):
+        if hashes is None:
+            hashes = [waveformHash(s) for s in signals]
+
+        msg = sigdatafmt.valueToBytes(0b00010101, np.uint8)
+        for s, h in zip(signals, hashes):
+            msg += h
+            msg += sigdatafmt.valueToBytes(len(s), np.uint64)
+            msg += sigdatafmt.arrayToBytes(s, np.complex64)
+
+        self.sendMsgWQ(msg, qs)
+        self._addHashHint(hashes)
+
+    # 以前に送った信号であればハッシュ値だけを送り，キャッシュになければ信号全体を送る
+    def setTransmitSignalCached(self, signals, qs=b''):
+        hashes = [waveformHash(s) for s in signals]
+        key = tuple(hashes)
+        if key in self._hashHints:
+            self._hashHints.move_to_end(key)
+            if self.setTransmitSignalByHash(hashes, qs):
+                return True
+
+            # サーバ側で破棄されていた
+            del self._hashHints[key]
+
+        self.setTransmitSignalWithHash(signals, hashes, qs)
+        return False
+
+    def _addHashHint(self, hashes):
+        self._hashHints[tuple(hashes)] = True
+        self._hashHints.move_to_end(tuple(hashes))
+        while len(self._hashHints) > self.maxHashHints:
+            self._hashHints.popitem(last=False)
     
     def startTransmitLoop(self, qs=b''):
         msg = sigdatafmt.valueToBytes(0b00010001, np.uint8)
@@ -97,15 +540,30 @@ class CyclicTransmitter:
         msg = sigdatafmt.valueToBytes(0b00010010, np.uint8)
         self.sendMsgWQ(msg, qs)
     
-    def transmit(self, signals, qs1=b'', qs2=b''):
-        self.setTransmitSignal(signals, qs1)
+    def transmit(self, signals, qs1=b'', qs2=b'', cache=False):
+        if cache:
+            self.setTransmitSignalCached(signals, qs1)
+        else:
+            self.setTransmitSignal(signals, qs1)
+
         self.startTransmitLoop(qs2)
 
 
 class CyclicReceiver:
-    def __init__(self, client, target):
+    # wireFormat: 受信信号を受け取る形式（"fc32", "sc16", "sc8"）
+    # wireScale: sc16/sc8で量子化するときのscale（0ならサーバがバッファごとのピークから決める）
+    # timestamps: Trueなら受信信号の先頭サンプルのデバイス時刻とサンプル番号も受け取る
+    def __init__(self, client, target, wireFormat="fc32", wireScale=0, timestamps=False):
         self.client = client
         self.target = target
+        self.wireFormat = wireFormat
+        self.wireScale = wireScale
+        self.timestamps = timestamps
+        self.lastMetadata = None
+        self.lastLostSamples = 0
+        self.lastNumSamples = 0         # 直前のreceiveResponseOnlyで受け取ったバッファの長さ
+        self.lastCancelled = False      # 直前のtimeout付きのreceiveかreceiveChunkedが打ち切られたか
+        self.numTargets = 1             # 返答を返すコントローラの数（TargetGroupでは一致した数）
 
     def sendMsgWQ(self, msg, qs):
         self.client.sendMsg(self.target, sigdatafmt.valueToBytes(len(qs), np.uint64) + qs + msg)
@@ -118,22 +576,315 @@ class CyclicReceiver:
         msg = sigdatafmt.valueToBytes(0b00010010, np.uint8)
         self.sendMsgWQ(msg, qs)
     
-    def receive(self, size, qs=b''):
-        self.receiveRequestOnly(size, qs)
-        return self.receiveResponseOnly()
+    # timeout [s] までに受信し終えなければ，サーバに打ち切らせてReceiveTimeoutを投げる
+    # 打ち切った後も接続はそのまま使える
+    # timeoutを指定してもoutを省略した場合はバッファごとの配列のリストを返し，受け取ったサンプル数はlastNumSamplesに入る
+    def receive(self, size, qs=b'', out=None, timeout=None):
+        if timeout is None:
+            self.receiveRequestOnly(size, qs)
+            return self.receiveResponseOnly(out)
+
+        # 受信を待っている間はこの接続で問い合わせられないので，打ち切りに使うセッションIDを先に読んでおく
+        if self.client.sessionId is None:
+            self.client.sessionInfo()
+
+        done = threading.Event()
+        def cancelLater():
+            if not done.wait(timeout):
+                self._cancelUntilDone(done)
+
+        th = threading.Thread(target=cancelLater, daemon=True)
+        th.start()
+        try:
+            self.receiveRequestOnly(size, qs)
+            signals = self.receiveResponseOnly(out)
+            self.lastCancelled = self.lastNumSamples < size
+            if out is not None:
+                signals = out[:, : self.lastNumSamples]
+        finally:
+            done.set()
+            th.join()
+
+        if self.lastCancelled:
+            raise ReceiveTimeout(signals)
+        return signals
+
+    # このコントローラが処理中の受信命令を打ち切らせる．打ち切る命令がなければFalseを返す
+    # 受信を待っているスレッドには，受信し終えた分までに切り詰められた返答が届く
+    # 受信命令を送った接続は返答を待っているので，打ち切りは別の接続で送る
+    # 先にclient.sessionInfo()を呼んでおくと，この接続が送った受信命令だけを打ち切る（呼んでいなければ誰の命令でも打ち切る）
+    def cancel(self):
+        with EzSDRClient(self.client.ipaddr, self.client.port) as conn:
+            return conn.cancelRequest(self.target, self.client.sessionId)
+
+    # サーバが受信命令を処理し始める前に打ち切ろうとしても受け付けられないので，doneになるまで送り直す
+    def _cancelUntilDone(self, done, interval=0.01):
+        with EzSDRClient(self.client.ipaddr, self.client.port) as conn:
+            while not conn.cancelRequest(self.target, self.client.sessionId):
+                if done.wait(interval):
+                    return
 
     def receiveRequestOnly(self, size, qs=b''):
-        msg = sigdatafmt.valueToBytes(0b00010000, np.uint8)
+        self.sendMsgWQ(self.receiveRequestMsg(size), qs)
+        self.client.expectResponses(self.numTargets)
+
+    # 受信命令のメッセージ（サブ引数を除く）
+    def receiveRequestMsg(self, size):
+        if self.timestamps:
+            msg = sigdatafmt.valueToBytes(0b00011000, np.uint8)
+            msg += sigdatafmt.valueToBytes(size, np.uint64)
+            msg += sigdatafmt.valueToBytes(sigdatafmt.wireFormatId(self.wireFormat), np.uint8)
+            msg += sigdatafmt.valueToBytes(self.wireScale, np.float32)
+        elif self.wireFormat == "fc32":
+            msg = sigdatafmt.valueToBytes(0b00010000, np.uint8)
+            msg += sigdatafmt.valueToBytes(size, np.uint64)
+        else:
+            msg = sigdatafmt.valueToBytes(0b00010100, np.uint8)
+            msg += sigdatafmt.valueToBytes(size, np.uint64)
+            msg += sigdatafmt.valueToBytes(sigdatafmt.wireFormatId(self.wireFormat), np.uint8)
+            msg += sigdatafmt.valueToBytes(self.wireScale, np.float32)
+        return msg
+
+    # outに(nbuf, size)のcomplex64の配列を渡すと，受信信号を直接書き込んでoutを返す
+    # 省略した場合はバッファごとのcomplex64の配列のリストを返す
+    # cancelで打ち切られた場合は各バッファが要求より短くなる（outには先頭から書き込む）．バッファの長さはlastNumSamplesに入る
+    # timestampsなら各バッファのReceiveMetadataをlastMetadataに入れ，outを省略した場合は.metaを付けたReceivedSignalを返す
+    def receiveResponseOnly(self, out=None, wireFormat=None, timestamps=None):
+        if wireFormat is None:
+            wireFormat = self.wireFormat
+        if timestamps is None:
+            timestamps = self.timestamps
+
+        self.client.responseRead()
+        sock = self.client.sock
+        nbuf = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+        ret = [] if out is None else out
+        metas = [] if timestamps else None
+        for i in range(nbuf):
+            if timestamps:
+                optlen = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+                metas.append(parseReceiveMetadata(sigdatafmt.readBytesFromSock(sock, optlen)))
+
+            nsamples = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+            self.lastNumSamples = nsamples if i == 0 else min(self.lastNumSamples, nsamples)
+            scale = 1.0
+            if wireFormat != "fc32":
+                scale = sigdatafmt.readFloat32FromSock(sock)
+
+            if out is None:
+                sig = sigdatafmt.readSignalFromSockInto(sock, np.empty(nsamples, dtype=np.complex64), wireFormat, scale)
+                if timestamps:
+                    sig = sig.view(ReceivedSignal)
+                    sig.meta = metas[i]
+                ret.append(sig)
+            else:
+                sigdatafmt.readSignalFromSockInto(sock, out[i, :nsamples], wireFormat, scale)
+
+        self.lastMetadata = metas
+        return ret
+
+    # sizeサンプルの受信をchunkサンプルずつに分けて受け取る
+    # サーバは受信し終えたチャンクから返答するので，巨大な受信でもサーバのメモリ使用量はchunkに比例する分だけで済む
+    # outに(nbuf, size)のcomplex64の配列を渡すと直接書き込んでoutを返す．省略した場合は新しい配列を返す
+    # 取りこぼしたサンプル数の合計はlastLostSamplesに，受け取ったサンプル数はlastNumSamplesに入る
+    # cancelで打ち切られた場合は，受信し終えた分までのoutのビューを返してlastCancelledをTrueにする
+    def receiveChunked(self, size, chunk=2**20, qs=b'', out=None):
+        end = 0
+        self.lastNumSamples = 0
+        for c in self.receiveChunks(size, chunk, qs):
+            if out is None:
+                out = np.empty((c.signals.shape[0], size), dtype=np.complex64)
+            end = c.offset + c.signals.shape[1]
+            out[:, c.offset : end] = c.signals
+            self.lastNumSamples = end
+        if out is None:
+            return np.empty((0, 0), dtype=np.complex64)
+        return out[:, :end] if self.lastCancelled else out
+
+    # receiveChunkedと同じ受信をして，チャンクが届くたびにReceivedChunkを返すイテレータ
+    # 受信の途中で閉じると残りの返答を読み捨てる
+    # cancelで打ち切られると，受信し終えた分の短いチャンクを最後に返して終わる
+    def receiveChunks(self, size, chunk=2**20, qs=b''):
+        self.client.ensureNoPendingResponses("receiveChunks")
+        msg = sigdatafmt.valueToBytes(0b00011011, np.uint8)
+        msg += sigdatafmt.valueToBytes(size, np.uint64)
+        msg += sigdatafmt.valueToBytes(chunk, np.uint64)
+        self.sendMsgWQ(msg, qs)
+
+        sock = self.client.sock
+        nbuf, total = np.frombuffer(sigdatafmt.readBytesFromSock(sock, 16), dtype=np.uint64)
+        nbuf, total = int(nbuf), int(total)
+        self.lastLostSamples = 0
+        self.lastCancelled = False
+        offset = 0
+        try:
+            while offset < total:
+                n = min(chunk, total - offset)
+                lost = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+                if lost == CANCELLED_CHUNK_MARKER:
+                    # 返答はここで終わる
+                    n = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+                    lost = 0
+                    total = offset + n
+                    self.lastCancelled = True
+                signals = np.empty((nbuf, n), dtype=np.complex64)
+                for i in range(nbuf):
+                    sigdatafmt.readSignalFromSockInto(sock, signals[i], "fc32", 1.0)
+
+                self.lastLostSamples += lost
+                offset += n
+                yield ReceivedChunk(offset - n, lost, signals)
+        finally:
+            while offset < total:
+                n = min(chunk, total - offset)
+                lost = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+                if lost == CANCELLED_CHUNK_MARKER:
+                    n = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+                    total = offset + n
+                sigdatafmt.readBytesFromSock(sock, 8 * n * nbuf)
+                offset += n
+
+    # 受信信号をringの共有メモリに書き込ませて受け取る（サーバと同じホストでのみ使える）
+    # copy=Falseなら共有メモリ上のビューを返すので，リングが一周する前に使い終える
+    def receiveShared(self, size, ring, copy=True, qs=b''):
+        self.receiveSharedRequestOnly(size, ring, qs)
+        return self.receiveSharedResponseOnly(ring, copy)
+
+    def receiveSharedRequestOnly(self, size, ring, qs=b''):
+        name = ring.serverName().encode(encoding="utf-8")
+        msg = sigdatafmt.valueToBytes(0b00011001, np.uint8)
         msg += sigdatafmt.valueToBytes(size, np.uint64)
+        msg += sigdatafmt.valueToBytes(len(name), np.uint64) + name
         self.sendMsgWQ(msg, qs)
+        self.client.expectResponses(self.numTargets)
+
+    def receiveSharedResponseOnly(self, ring, copy=True):
+        self.client.responseRead()
+        sock = self.client.sock
+        nbuf = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+        desc = np.frombuffer(sigdatafmt.readBytesFromSock(sock, 16 * nbuf), dtype=np.uint64).reshape(nbuf, 2)
+        ret = [ring.view(int(offset), int(n)) for n, offset in desc]
+        return [e.copy() for e in ret] if copy else ret
+
+    # サーバがringをマップしたままにしないように解放させる（ringをcloseする前に呼ぶ）
+    def releaseShared(self, ring):
+        name = ring.serverName().encode(encoding="utf-8")
+        msg = sigdatafmt.valueToBytes(0b00011100, np.uint8)
+        msg += sigdatafmt.valueToBytes(len(name), np.uint64) + name
+        self.sendMsgWQ(msg, b'')
 
-    def receiveResponseOnly(self):
-        nbuf = sigdatafmt.readInt64FromSock(self.client.sock)
-        ret = []
+    # アライメントごとにsizeサンプルをperiods回受信して平均した信号を受け取る
+    # changeAlignSizeで送信信号の周期（の約数）に揃えておけば同期加算になる
+    def receiveAveraged(self, size, periods, qs=b'', out=None):
+        self.receiveAveragedRequestOnly(size, periods, qs)
+        return self.receiveAveragedResponseOnly(out)
+
+    def receiveAveragedRequestOnly(self, size, periods, qs=b''):
+        msg = sigdatafmt.valueToBytes(0b00010101, np.uint8)
+        msg += sigdatafmt.valueToBytes(size, np.uint64)
+        msg += sigdatafmt.valueToBytes(periods, np.uint64)
+        self.sendMsgWQ(msg, qs)
+        self.client.expectResponses(self.numTargets)
+
+    def receiveAveragedResponseOnly(self, out=None):
+        # 平均した信号は常にfc32で返ってくる
+        return self.receiveResponseOnly(out, wireFormat="fc32", timestamps=False)
+
+    # 窓内の平均電力（全チャネルの平均）がthresholdを超えた時点の前preサンプルと後postサンプルを受信する
+    # timeout秒以内にトリガがかからなければtriggeredがFalseになる（timeout=0なら待ち続ける）
+    def receiveTriggered(self, pre, post, threshold, window=64, timeout=1.0, qs=b''):
+        self.receiveTriggeredRequestOnly(pre, post, threshold, window, timeout, qs)
+        return self.receiveTriggeredResponseOnly()
+
+    def receiveTriggeredRequestOnly(self, pre, post, threshold, window=64, timeout=1.0, qs=b''):
+        msg = sigdatafmt.valueToBytes(0b00010110, np.uint8)
+        msg += sigdatafmt.valueToBytes(pre, np.uint64)
+        msg += sigdatafmt.valueToBytes(post, np.uint64)
+        msg += sigdatafmt.valueToBytes(window, np.uint64)
+        msg += sigdatafmt.valueToBytes(threshold, np.float32)
+        msg += sigdatafmt.valueToBytes(int(timeout * 1000), np.uint64)
+        self.sendMsgWQ(msg, qs)
+        self.client.expectResponses(self.numTargets)
+
+    def receiveTriggeredResponseOnly(self):
+        sock = self.client.sock
+        nthread = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+        header = np.frombuffer(sigdatafmt.readBytesFromSock(sock, 9 * nthread), dtype=np.dtype([("triggered", np.uint8), ("index", "<i8")]))
+        signals = self.receiveResponseOnly(wireFormat="fc32", timestamps=False)
+        return TriggeredCapture(signals, [bool(e) for e in header["triggered"]], [int(e) for e in header["index"]])
+
+    # nfftサンプルごとに窓関数をかけたパワースペクトルをnavg回平均したものをサーバで計算して受け取る（Welch法）
+    # nfftは2のべき乗，windowはPSD_WINDOWSのいずれか
+    def receivePSD(self, nfft, window="hann", navg=16, maxHold=False, qs=b''):
+        self.receivePSDRequestOnly(nfft, window, navg, maxHold, qs)
+        return self.receivePSDResponseOnly(maxHold)
+
+    def receivePSDRequestOnly(self, nfft, window="hann", navg=16, maxHold=False, qs=b''):
+        msg = sigdatafmt.valueToBytes(0b00010111, np.uint8)
+        msg += sigdatafmt.valueToBytes(nfft, np.uint64)
+        msg += sigdatafmt.valueToBytes(PSD_WINDOWS[window], np.uint8)
+        msg += sigdatafmt.valueToBytes(navg, np.uint64)
+        msg += sigdatafmt.valueToBytes(1 if maxHold else 0, np.uint8)
+        self.sendMsgWQ(msg, qs)
+        self.client.expectResponses(self.numTargets)
+
+    # maxHoldは要求と同じ値を渡す
+    def receivePSDResponseOnly(self, maxHold=False):
+        self.client.responseRead()
+        sock = self.client.sock
+        nbuf = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+        avgs, mholds = [], []
         for i in range(nbuf):
-            nsamples = sigdatafmt.readInt64FromSock(self.client.sock)
-            ret.append(sigdatafmt.readSignalFromSock(self.client.sock, nsamples))
-        return ret
+            nfft = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+            avgs.append(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 4 * nfft), dtype=np.float32))
+            if maxHold:
+                mholds.append(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 4 * nfft), dtype=np.float32))
+        return PSDFrame(np.array(avgs), np.array(mholds) if len(mholds) != 0 else None)
+
+    # PSDのフレームを順に返すイテレータ（numFramesがNoneなら止めるまで続ける）
+    # 次のフレームの要求を先に送っておくので，サーバはクライアントの処理中にも次のフレームを計算できる
+    def psdFrames(self, nfft, window="hann", navg=16, maxHold=False, numFrames=None):
+        self.receivePSDRequestOnly(nfft, window, navg, maxHold)
+        nsent, nrecv = 1, 0
+        try:
+            while numFrames is None or nrecv < numFrames:
+                if numFrames is None or nsent < numFrames:
+                    self.receivePSDRequestOnly(nfft, window, navg, maxHold)
+                    nsent += 1
+
+                frame = self.receivePSDResponseOnly(maxHold)
+                nrecv += 1
+                yield frame
+        finally:
+            # 途中で止められたときは送ってしまった要求の返答を読み捨てる
+            for _ in range(nsent - nrecv):
+                self.receivePSDResponseOnly(maxHold)
+
+    # 受信ループが受信した信号をblockサンプルずつ受け取り続けるイテレータ
+    # 同じコントローラを購読している他の接続とデバイスの受信を共有するので，記録・PSD表示・復調などを同時に行える
+    # サーバは購読者ごとに最大depth個のブロックを溜め，溢れたらdropで指定したブロック（"oldest"か"newest"）を捨てる
+    # 購読はそれ専用の接続で行い，イテレータを閉じると接続を切って購読をやめる
+    def subscribe(self, block, drop="oldest", depth=8, qs=b''):
+        msg = sigdatafmt.valueToBytes(0b00011010, np.uint8)
+        msg += sigdatafmt.valueToBytes(block, np.uint64)
+        msg += sigdatafmt.valueToBytes(depth, np.uint64)
+        msg += sigdatafmt.valueToBytes(SUBSCRIBE_DROP_POLICIES[drop], np.uint8)
+
+        with EzSDRClient(self.client.ipaddr, self.client.port) as conn:
+            conn.sendMsg(self.target, sigdatafmt.valueToBytes(len(qs), np.uint64) + qs + msg)
+            sock = conn.sock
+            while True:
+                header = np.frombuffer(sigdatafmt.readBytesFromSock(sock, 24), dtype=SUBSCRIBED_BLOCK_HEADER)[0]
+                seq, dropped, nbuf = int(header["seq"]), int(header["dropped"]), int(header["nbuf"])
+                if nbuf == 0:
+                    continue    # ブロックが届いていないときの生存確認
+
+                signals = np.empty((nbuf, block), dtype=np.complex64)
+                for i in range(nbuf):
+                    nsamples = int(np.frombuffer(sigdatafmt.readBytesFromSock(sock, 8), dtype=np.uint64)[0])
+                    sigdatafmt.readSignalFromSockInto(sock, signals[i, :nsamples], "fc32", 1.0)
+
+                yield SubscribedBlock(seq, dropped, signals)
 
     def changeAlignSize(self, value):
         msg = sigdatafmt.valueToBytes(0b0010011, np.uint8)
@@ -142,7 +893,7 @@ class CyclicReceiver:
 
 
 class SimpleClient:
-    def __init__(self, ipaddr, port, nTXUSRPs, nRXUSRPs):
+    def __init__(self, ipaddr, port, nTXUSRPs, nRXUSRPs, wireFormat="fc32", timestamps=False, compression=None):
         if type(nTXUSRPs) is int:
             nTXUSRPs = [nTXUSRPs]
         else:
@@ -153,15 +904,18 @@ class SimpleClient:
         else:
             nRXUSRPs = nRXUSRPs
 
+        self.nTXUSRPs = nTXUSRPs
+        self.nRXUSRPs = nRXUSRPs
         self.client = EzSDRClient(ipaddr, port)
         self.txs = []
         self.rxs = []
+        self.syncHostTime = None
 
         for i in range(len(nTXUSRPs)):
-            self.txs.append(CyclicTransmitter(self.client, f"TX{i}"))
+            self.txs.append(CyclicTransmitter(self.client, f"TX{i}", wireFormat, compression))
 
         for i in range(len(nRXUSRPs)):
-            self.rxs.append(CyclicReceiver(self.client, f"RX{i}"))
+            self.rxs.append(CyclicReceiver(self.client, f"RX{i}", wireFormat, timestamps=timestamps))
 
     def __enter__(self):
         self.client.__enter__()
@@ -173,9 +927,15 @@ class SimpleClient:
     def connect(self):
         self.client.connet()
 
+    # cache=Trueなら以前に送った信号はハッシュ値だけを送る
+    # ただしキャッシュにない信号はfc32で一度に送るので，wireFormatやcompressionは使われない
     def transmit(self, signals, **kwargs):
         tidx = kwargs.get("tidx", 0)
-        self.txs[tidx].transmit(signals)
+        self.txs[tidx].transmit(signals, cache=kwargs.get("cache", False))
+
+    def patchTransmitSignal(self, channel, offset, signal, **kwargs):
+        tidx = kwargs.get("tidx", 0)
+        return self.txs[tidx].patchTransmitSignal(channel, offset, signal)
 
     def receive(self, nsamples, **kwargs):
         ridx = kwargs.get("ridx", 0)
@@ -188,32 +948,69 @@ class SimpleClient:
         else:
             return None
 
+    # すべてのRXコントローラから同時にnsamplesずつ受信して，(nController, nChannel, nsamples)の配列で返す
+    # 要求は"/RX0|RX1|..."の1つのメッセージで送り，サーバは各コントローラで並列に受信して名前順に返答する
+    # nChannelはコントローラのうち最大のチャネル数で，チャネル数が少ないコントローラの残りは0になる
+    def receiveAll(self, nsamples, qs=b''):
+        names = [rx.target for rx in self.rxs]
+        msg = self.rxs[0].receiveRequestMsg(nsamples)
+        self.client.sendMsg("/" + "|".join(names), sigdatafmt.valueToBytes(len(qs), np.uint64) + qs + msg)
+        self.client.expectResponses(len(names))
+
+        out = np.zeros((len(self.rxs), max(self.nRXUSRPs), nsamples), dtype=np.complex64)
+        for name in sorted(names):
+            i = names.index(name)
+            self.rxs[i].receiveResponseOnly(out=out[i])
+        return out
+
+    def receiveAveraged(self, nsamples, periods, **kwargs):
+        ridx = kwargs.get("ridx", 0)
+        return self.rxs[ridx].receiveAveraged(nsamples, periods)
+
+    # thresholdDbは1チャネルあたりの平均電力 [dB]
+    def receiveTriggered(self, pre, post, thresholdDb, **kwargs):
+        ridx = kwargs.get("ridx", 0)
+        return self.rxs[ridx].receiveTriggered(pre, post, 10**(thresholdDb/10), kwargs.get("window", 64), kwargs.get("timeout", 1.0))
+
+    def psdFrames(self, nfft, window="hann", navg=16, maxHold=False, **kwargs):
+        ridx = kwargs.get("ridx", 0)
+        return self.rxs[ridx].psdFrames(nfft, window, navg, maxHold, kwargs.get("numFrames", None))
+
     def changeRxAlignSize(self, newAlign, **kwargs):
         ridx = kwargs.get("ridx", 0)
         self.rxs[ridx].changeAlignSize(newAlign)
 
-    def sync(self):
-        for e in self.txs:
-            e.stopTransmitLoop()
-        
-        for e in self.rxs:
-            e.stopReceiveLoop()
+    # 次のPPSでデバイス時刻を0にして，時刻startTime [s] から送受信ループを再開する
+    def sync(self, startTime=1):
+        txs, rxs = self.txGroup(), self.rxGroup()
+        if txs is not None:
+            txs.stopTransmitLoop()
+        if rxs is not None:
+            rxs.stopReceiveLoop()
 
         self.client.setParamToAllDevice("set_time_unknown_pps_to_zero", "[]")
+        self.syncHostTime = time.monotonic()
+
+        if txs is not None:
+            txs.startTransmitLoop(onTime(startTime))
+        if rxs is not None:
+            rxs.startReceiveLoop(onTime(startTime))
 
-        for e in self.txs:
-            e.startTransmitLoop(onTime(1))
+    # このクライアントが使うすべてのTX（RX）コントローラにまとめて送るTargetGroup（なければNone）
+    def txGroup(self):
+        return self.client.group("|".join(re.escape(e.target) for e in self.txs), regex=True) if len(self.txs) != 0 else None
 
-        for e in self.rxs:
-            e.startReceiveLoop(onTime(1))
+    def rxGroup(self):
+        return self.client.group("|".join(re.escape(e.target) for e in self.rxs), regex=True) if len(self.rxs) != 0 else None
 
+    # デバイス時刻 [s] の上限の見積もり
+    # 時刻はsyncの後のPPSで0になるので，syncからの経過時間より進んでいることはない
+    # syncを呼ぶ前は見積もれないので，TimedSchedulerやSweepEngineにはclockを渡す
+    def deviceTimeUpperBound(self):
+        if self.syncHostTime is None:
+            raise RuntimeError("deviceTimeUpperBound requires sync() to be called first; otherwise pass an explicit clock.")
+        return time.monotonic() - self.syncHostTime
 
-    # def rxPowerThr(self, p, m):
-    #     ridx = kwargs.get("ridx", 0)
-    #     self.sock.sendall(b'p')
-    #     sigdatafmt.writeInt32ToSock(self.sock, ridx)
-    #     sigdatafmt.writeFloat32ToSock(self.sock, p)
-    #     sigdatafmt.writeFloat32ToSock(self.sock, m)
 
     # def clearCmdQueue(self):
     #     self.sock.sendall(b'q')
@@ -0,0 +1,148 @@
+import numpy as np
+import scipy.fft
+
+
+# OFDM変復調器
+# サブキャリアの配置は従来のmod_ofdm/demod_ofdmと同じで，
+# DCを空けて正の周波数側にnSC//2本，負の周波数側に残りを配置する．
+class OFDM:
+    def __init__(self, nFFT, nSC, nCP, workers=-1):
+        assert nSC < nFFT
+        self.nFFT = nFFT
+        self.nSC = nSC
+        self.nCP = nCP
+        self.nSymLen = nFFT + nCP
+        self.workers = workers
+
+        # サブキャリア番号 -> FFTビン番号
+        self.scIndex = np.hstack((np.arange(1, nSC//2 + 1), np.arange(nFFT - (nSC - nSC//2), nFFT)))
+
+        # shapeごとの作業用バッファ
+        self._buffers = {}
+
+
+    def _workBuffer(self, shape):
+        shape = tuple(shape)
+        buf = self._buffers.get(shape)
+        if buf is None:
+            # ストリーミング復調などでshapeが毎回変わっても際限なく増えないようにする
+            if len(self._buffers) >= 8:
+                self._buffers.pop(next(iter(self._buffers)))
+
+            buf = np.zeros(shape, dtype=np.complex64)
+            self._buffers[shape] = buf
+        return buf
+
+
+    def numSymbols(self, nsamples):
+        return nsamples // self.nSymLen
+
+
+    # OFDM変調
+    # scsの形状は(..., nSYM*nSC)もしくは(..., nSYM, nSC)で，
+    # 最後の軸以外（アンテナなど）もまとめて一回のIFFTで処理する
+    def modulate(self, scs, out=None):
+        scs = np.asarray(scs)
+        if scs.shape[-1] != self.nSC or scs.ndim == 1:
+            assert scs.shape[-1] % self.nSC == 0
+            scs = scs.reshape(scs.shape[:-1] + (scs.shape[-1] // self.nSC, self.nSC))
+
+        lead = scs.shape[:-1]
+        nSYM = lead[-1]
+
+        # 作業用バッファは復調と共用していて，ガードとDCのビンも書き換えられているのでゼロに戻してから配置する
+        work = self._workBuffer(lead + (self.nFFT,))
+        work[...] = 0
+        work[..., self.scIndex] = scs
+        sym = scipy.fft.ifft(work, axis=-1, norm="ortho", overwrite_x=True, workers=self.workers)
+
+        if out is None:
+            out = np.empty(lead[:-1] + (nSYM * self.nSymLen,), dtype=np.complex64)
+
+        dst = out.reshape(lead + (self.nSymLen,))
+        dst[..., self.nCP:] = sym
+        dst[..., :self.nCP] = sym[..., self.nFFT - self.nCP:]
+        return out
+
+
+    # OFDM復調
+    # sigの形状は(..., nSYM*(nFFT+nCP))で，(..., nSYM, nSC)のサブキャリアを返す
+    def demodulate(self, sig, out=None):
+        sig = np.asarray(sig)
+        nSYM = sig.shape[-1] // self.nSymLen
+        lead = sig.shape[:-1] + (nSYM,)
+
+        sym = sig[..., :nSYM * self.nSymLen].reshape(lead + (self.nSymLen,))
+        work = self._workBuffer(lead + (self.nFFT,))
+        np.copyto(work, sym[..., self.nCP:], casting="same_kind")
+        scs = scipy.fft.fft(work, axis=-1, norm="ortho", overwrite_x=True, workers=self.workers)
+
+        if out is None:
+            out = np.empty(lead + (self.nSC,), dtype=np.complex64)
+
+        np.take(scs, self.scIndex, axis=-1, out=out)
+        return out
+
+
+    # FFTの全ビンを返すOFDM復調（PSD表示などに利用する）
+    def demodulateAllBins(self, sig):
+        sig = np.asarray(sig)
+        nSYM = sig.shape[-1] // self.nSymLen
+        lead = sig.shape[:-1] + (nSYM,)
+        sym = sig[..., :nSYM * self.nSymLen].reshape(lead + (self.nSymLen,))
+        return scipy.fft.fft(sym[..., self.nCP:].astype(np.complex64), axis=-1, norm="ortho", workers=self.workers)
+
+
+    def streamDemodulator(self, nChannel=1):
+        return OFDMStreamDemodulator(self, nChannel)
+
+
+# 任意長の受信信号を逐次与えてOFDM復調する
+# シンボルの途中で切れた信号は次の呼び出しまで持ち越す
+class OFDMStreamDemodulator:
+    def __init__(self, ofdm, nChannel=1):
+        self.ofdm = ofdm
+        self.nChannel = nChannel
+        self._carry = np.zeros((nChannel, ofdm.nSymLen), dtype=np.complex64)
+        self._nCarry = 0
+
+
+    def reset(self):
+        self._nCarry = 0
+
+
+    # chunkの形状は(nChannel, n)もしくは(n,)で，(nChannel, nSYM, nSC)を返す
+    def push(self, chunk):
+        L = self.ofdm.nSymLen
+        chunk = np.asarray(chunk)
+        if chunk.ndim == 1:
+            chunk = chunk[None, :]
+        assert chunk.shape[0] == self.nChannel
+
+        # 持ち越したシンボルを埋める
+        nHead = 0
+        if self._nCarry != 0:
+            take = min(L - self._nCarry, chunk.shape[1])
+            self._carry[:, self._nCarry : self._nCarry + take] = chunk[:, :take]
+            self._nCarry += take
+            chunk = chunk[:, take:]
+            if self._nCarry == L:
+                nHead = 1
+
+        nBody = chunk.shape[1] // L
+        out = np.empty((self.nChannel, nHead + nBody, self.ofdm.nSC), dtype=np.complex64)
+
+        if nHead:
+            self.ofdm.demodulate(self._carry, out=out[:, :1])
+            self._nCarry = 0
+
+        if nBody:
+            self.ofdm.demodulate(chunk[:, :nBody * L], out=out[:, nHead:])
+
+        # 残りを次回に持ち越す
+        rem = chunk.shape[1] - nBody * L
+        if rem != 0:
+            self._carry[:, :rem] = chunk[:, nBody * L:]
+            self._nCarry = rem
+
+        return out
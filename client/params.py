@@ -0,0 +1,90 @@
+import time
+
+import ezsdr
+
+
+# デバイスのパラメータをクライアント側で覚えておく層
+# setで設定した値とgetで読んだ値をデバイスごとに覚え，ttl秒（Noneなら無期限）の間は読み直さない
+# 覚えている値と同じ値の設定は送らないので，周波数などを何度も設定し直すループで往復が減る
+# clientのsetParamToDeviceを直接呼んで設定した値は自動的に忘れる
+# 他のクライアントやデバイス自身が値を変えた場合は，invalidateで忘れさせる
+class DeviceParamCache:
+    def __init__(self, client, ttl=None, clock=time.monotonic):
+        self.client = client
+        client.paramCache = self
+        self.ttl = ttl
+        self.clock = clock
+        self.cache = {}             # {(デバイス名, キー): (値, 覚えた時刻)}
+        self.numSkippedSets = 0
+        self.numCachedGets = 0
+
+    def _lookup(self, target, key):
+        entry = self.cache.get((target, key))
+        if entry is None:
+            return None
+        if self.ttl is not None and self.clock() - entry[1] > self.ttl:
+            del self.cache[(target, key)]
+            return None
+        return entry
+
+    def _store(self, target, key, value):
+        self.cache[(target, key)] = (value, self.clock())
+
+    # valueはサーバに送る文字列（JSON）
+    # qsにonTimeなどを付けた設定は後で反映されるので，必ず送ってその値は忘れる
+    def set(self, target, key, value, qs=b'', force=False):
+        if len(qs) != 0:
+            self.client.setParamToDevice(target, key, value, qs)
+            self.invalidate(target, key)
+            return True
+
+        entry = self._lookup(target, key)
+        if not force and entry is not None and entry[0] == value:
+            self.numSkippedSets += 1
+            return False
+
+        self.client.setParamToDevice(target, key, value)
+        self._store(target, key, value)
+        return True
+
+    def get(self, target, key):
+        return self.getMany({target: [key]})[target][key]
+
+    # requests: {デバイス名: [キー, ...]}
+    # 覚えていない値のgetParamをまとめて送ってから返答を順に読み，{デバイス名: {キー: 値}}を返す
+    # デバイスが読み出せないキーがあれば，すべての返答を読んでからKeyErrorを投げる
+    def getMany(self, requests):
+        results, missing = {}, []
+        for target, keys in requests.items():
+            results[target] = {}
+            for key in keys:
+                entry = self._lookup(target, key)
+                if entry is not None:
+                    results[target][key] = entry[0]
+                    self.numCachedGets += 1
+                else:
+                    missing.append((target, key))
+
+        if len(missing) != 0:
+            self.client.ensureNoPendingResponses("getMany")
+            frames = [ezsdr.EzSDRClient.frameMsg(t, ezsdr.EzSDRClient.getParamMsg(k)) for t, k in missing]
+            self.client.sock.sendall(b"".join(frames))
+            unsupported = []
+            for target, key in missing:
+                value = self.client.readParamResponse()
+                if value is None:
+                    unsupported.append((target, key))
+                    continue
+                self._store(target, key, value)
+                results[target][key] = value
+
+            # 返答をすべて読んでから投げて，接続上に読み残しを作らない
+            if len(unsupported) != 0:
+                raise KeyError(f"devices cannot read parameters: {unsupported}")
+
+        return results
+
+    # targetやkeyを省略すると，そのすべてを忘れる
+    def invalidate(self, target=None, key=None):
+        for k in [k for k in self.cache if (target is None or k[0] == target) and (key is None or k[1] == key)]:
+            del self.cache[k]
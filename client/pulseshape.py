@@ -0,0 +1,231 @@
+import functools
+import math
+import numpy as np
+import scipy.fft
+import scipy.signal
+
+
+# RRCフィルタのインパルス応答
+# 同じ設計を何度も使うのでキャッシュしておく（返り値は書き換え不可）
+@functools.lru_cache(maxsize=64)
+def make_rrc_filter(Ntaps, Nos, beta):
+    ts = np.linspace(-Ntaps/2, Ntaps/2-1, Ntaps)
+    ps = ts / Nos
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hs = np.sin(np.pi * ps * (1 - beta)) + 4 * beta * ps * np.cos(np.pi * ps * (1 + beta))
+        hs = hs / Nos / (np.pi * ps * (1 - (4 * beta * ps)**2))
+    hs[Ntaps//2] = 1 / Nos * (1 + beta * (4 / np.pi - 1))
+    hs[np.abs(ts)==(Nos / 4 / beta)] = beta / Nos / np.sqrt(2) * ((1 + 2/np.pi) * np.sin(np.pi/(4*beta)) + (1 - 2/np.pi) * np.cos(np.pi/(4*beta)))
+    hs.setflags(write=False)
+    return hs
+
+
+# up/down倍のリサンプリング用の低域通過フィルタ（scipy.signal.resample_polyと同じ設計）
+@functools.lru_cache(maxsize=64)
+def design_lowpass(up, down, halfLen=10):
+    maxRate = max(up, down)
+    hs = scipy.signal.firwin(2 * halfLen * maxRate + 1, 1 / maxRate, window=("kaiser", 5.0)) * up
+    hs.setflags(write=False)
+    return hs
+
+
+def _isReal(*arrs):
+    return all(not np.iscomplexobj(a) for a in arrs)
+
+
+def _foldFilter(h, N):
+    # 巡回畳み込みでは，信号長より長いフィルタは信号長で折り返したものと等価
+    M = h.shape[-1]
+    if M <= N:
+        return h
+
+    dst = np.zeros(h.shape[:-1] + (N,), dtype=h.dtype)
+    for i in range(0, M, N):
+        seg = h[..., i : i + N]
+        dst[..., :seg.shape[-1]] += seg
+    return dst
+
+
+# overlap-save法によるFFTフィルタリング
+# x: (..., N), h: (..., M) で先頭の軸はブロードキャストされる．
+# ブロックをまとめて1回のscipy.fftで処理することで，workersで指定したコア数で並列に計算する．
+def _overlapSave(x, h, cyclic, nfft, workers, maxGroupSamples):
+    N = x.shape[-1]
+    M = h.shape[-1]
+    lead = np.broadcast_shapes(x.shape[:-1], h.shape[:-1])
+
+    if nfft is None:
+        nfft = scipy.fft.next_fast_len(max(8 * M, 4096))
+        nfft = min(nfft, scipy.fft.next_fast_len(N + M - 1))
+    assert nfft >= M
+
+    step = nfft - (M - 1)
+    nBlk = -(-N // step)
+
+    # 先頭にM-1サンプル（巡回なら信号の末尾，そうでなければ0）を付加する
+    xp = np.zeros(x.shape[:-1] + (M - 1 + nBlk * step,), dtype=np.complex64)
+    if cyclic and M > 1:
+        xp[..., :M-1] = x[..., N-(M-1):]
+    xp[..., M-1 : M-1+N] = x
+
+    H = scipy.fft.fft(np.asarray(h, dtype=np.complex64), nfft, axis=-1, workers=workers)[..., None, :]
+    segments = np.lib.stride_tricks.sliding_window_view(xp, nfft, axis=-1)[..., ::step, :]
+
+    y = np.empty(lead + (nBlk * step,), dtype=np.complex64)
+    nGroup = max(1, maxGroupSamples // (nfft * max(1, math.prod(lead))))
+    for b0 in range(0, nBlk, nGroup):
+        b1 = min(nBlk, b0 + nGroup)
+        X = scipy.fft.fft(segments[..., b0:b1, :], axis=-1, workers=workers) * H
+        Y = scipy.fft.ifft(X, axis=-1, overwrite_x=True, workers=workers)
+        y[..., b0*step : b1*step] = Y[..., M-1:].reshape(lead + ((b1 - b0) * step,))
+
+    return y[..., :N]
+
+
+# FIRフィルタリング（cyclic=Falseでscipy.signal.lfilter(h, 1, x)と同じ結果）
+# cyclic=Trueなら巡回畳み込みになり，ループ送信する信号の先頭と末尾に過渡応答が生じない
+def fftFilter(x, h, cyclic=False, nfft=None, workers=-1, maxGroupSamples=2**22):
+    x = np.asarray(x)
+    h = np.asarray(h)
+    if cyclic:
+        h = _foldFilter(h, x.shape[-1])
+
+    y = _overlapSave(x, h, cyclic, nfft, workers, maxGroupSamples)
+    return y.real if _isReal(x, h) else y
+
+
+# L倍のポリフェーズアップサンプリング（0挿入してからhでフィルタリングすることと等価）
+def upsample(x, L, h, cyclic=False, nfft=None, workers=-1, maxGroupSamples=2**22):
+    x = np.asarray(x)
+    h = np.asarray(h)
+    N = x.shape[-1]
+
+    # hp[p, k] = h[k*L + p]
+    Mp = -(-h.shape[-1] // L)
+    hpad = np.zeros(Mp * L, dtype=h.dtype)
+    hpad[:h.shape[-1]] = h
+    hp = hpad.reshape(Mp, L).T
+    if cyclic:
+        hp = _foldFilter(hp, N)
+
+    y = _overlapSave(x[..., None, :], hp, cyclic, nfft, workers, maxGroupSamples)   # (..., L, N)
+    y = np.swapaxes(y, -1, -2).reshape(x.shape[:-1] + (N * L,))
+    return y.real if _isReal(x, h) else y
+
+
+# D分の1のポリフェーズダウンサンプリング（hでフィルタリングしてからD-1サンプルを間引くことと等価）
+def downsample(x, D, h, cyclic=False, nfft=None, workers=-1, maxGroupSamples=2**22):
+    x = np.asarray(x)
+    h = np.asarray(h)
+    N = x.shape[-1]
+    if cyclic:
+        assert N % D == 0, "cyclic downsampling requires len(x) to be a multiple of D"
+
+    Nout = -(-N // D)
+
+    # hp[p, k] = h[k*D + p]
+    Mp = -(-h.shape[-1] // D)
+    hpad = np.zeros(Mp * D, dtype=h.dtype)
+    hpad[:h.shape[-1]] = h
+    hp = hpad.reshape(Mp, D).T
+    if cyclic:
+        hp = _foldFilter(hp, Nout)
+
+    # xp[p, n] = x[n*D - p]
+    xx = np.zeros(x.shape[:-1] + (D + Nout * D,), dtype=x.dtype)
+    if cyclic:
+        xx[..., :D] = x[..., N-D:]
+    xx[..., D : D+N] = x
+    xp = np.stack([xx[..., D - p :: D][..., :Nout] for p in range(D)], axis=-2)
+
+    y = _overlapSave(xp, hp, cyclic, nfft, workers, maxGroupSamples).sum(axis=-2)
+    return y.real if _isReal(x, h) else y
+
+
+# up/down倍のポリフェーズリサンプリング（0挿入してhでフィルタリングし，down-1サンプルを間引くことと等価）
+# 出力n番目はフィルタの位相(n*down) % upだけを使うので，必要な出力だけを計算する
+def _resamplePoly(x, up, down, h, cyclic, maxGroupSamples):
+    N = x.shape[-1]
+    if cyclic:
+        assert (N * up) % down == 0, "cyclic resampling requires len(x)*up to be a multiple of down"
+
+    Nout = -(-N * up // down)
+
+    # hp[p, k] = h[k*up + p]
+    K = -(-h.shape[-1] // up)
+    hpad = np.zeros(K * up, dtype=h.dtype)
+    hpad[:h.shape[-1]] = h
+    hp = hpad.reshape(K, up).T
+
+    # 先頭にK-1サンプル（巡回なら信号の末尾，そうでなければ0）を付加する
+    xp = np.zeros(x.shape[:-1] + (K - 1 + N,), dtype=x.dtype)
+    if cyclic and K > 1:
+        xp[..., :K-1] = np.take(x, np.arange(N - (K - 1), N) % N, axis=-1)
+    xp[..., K-1:] = x
+
+    dtype = np.float32 if _isReal(x, h) else np.complex64
+    y = np.empty(x.shape[:-1] + (Nout,), dtype=dtype)
+    step = max(1, maxGroupSamples // max(1, math.prod(x.shape[:-1])))
+    for m0 in range(0, Nout, step):
+        m = np.arange(m0, min(Nout, m0 + step))
+        phase = (m * down) % up
+        n0 = (m * down) // up + (K - 1)
+        acc = np.zeros(x.shape[:-1] + (m.shape[0],), dtype=dtype)
+        for k in range(K):
+            acc += hp[phase, k] * xp[..., n0 - k]
+        y[..., m0 : m0 + m.shape[0]] = acc
+
+    return y
+
+
+# up/down倍のリサンプリング
+# hを省略するとdesign_lowpass(up, down)を使う
+# compensateDelayなら，scipy.signal.resample_polyと同じくフィルタの群遅延((len(h)-1)//2)を差し引いて，
+# 長さceil(len(x)*up/down)の遅延のない信号を返す．Falseならlfilterと同じ因果的な出力を返す
+def resample(x, up, down, h=None, cyclic=False, compensateDelay=True, nfft=None, workers=-1, maxGroupSamples=2**22):
+    g = math.gcd(up, down)
+    up //= g
+    down //= g
+
+    x = np.asarray(x)
+    if up == down == 1:
+        return x.copy()
+
+    if h is None:
+        h = design_lowpass(up, down)
+    h = np.asarray(h)
+
+    N = x.shape[-1]
+    Nout = -(-N * up // down)
+    shift = 0
+    if compensateDelay:
+        # 群遅延が出力のサンプル間隔の整数倍になるように，フィルタの先頭に0を足す
+        half = (h.shape[-1] - 1) // 2
+        pre = (-half) % down
+        h = np.concatenate((np.zeros(pre, dtype=h.dtype), h))
+        shift = (half + pre) // down
+        if not cyclic:
+            # 遅延の分だけ出力が長くなるように，末尾に0を足す
+            Nin = -(-(shift + Nout) * down // up)
+            x = np.concatenate((x, np.zeros(x.shape[:-1] + (Nin - N,), dtype=x.dtype)), axis=-1)
+
+    if down == 1:
+        y = upsample(x, up, h, cyclic, nfft, workers, maxGroupSamples)
+    elif up == 1:
+        y = downsample(x, down, h, cyclic, nfft, workers, maxGroupSamples)
+    else:
+        y = _resamplePoly(x, up, down, h, cyclic, maxGroupSamples)
+
+    if cyclic:
+        return np.roll(y, -shift, axis=-1) if shift else y
+    return y[..., shift : shift + Nout]
+
+
+# シンボル列をnOS倍にアップサンプリングしてRRCフィルタで帯域制限する
+# np.repeatとlfilterを使っていた従来の処理の置き換え
+def pulseShape(symbols, nOS, beta=0.5, Ntaps=None, cyclic=True, workers=-1):
+    if Ntaps is None:
+        Ntaps = 16 * nOS
+
+    # 0挿入で平均電力が1/nOSになるので，フィルタ係数をnOS倍して振幅を合わせる
+    return upsample(symbols, nOS, make_rrc_filter(Ntaps, nOS, beta) * nOS, cyclic=cyclic, workers=workers)
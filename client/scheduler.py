@@ -0,0 +1,82 @@
+import time
+import numpy as np
+from collections import namedtuple
+
+import ezsdr
+import sigdatafmt
+
+
+# time: デバイス時刻 [s], target: 送り先（"TX0"など）, msg: サブ引数を除いたメッセージ
+# isDevice: Trueならmsgはデバイス宛てのsetParam（EzSDRClient.setParamMsgで作る）
+ScheduledCommand = namedtuple("ScheduledCommand", ["time", "target", "msg", "isDevice"])
+
+# sent: 送信したコマンド（時刻順）, late: 締め切りに間に合わなかったと思われるコマンド
+# slack: 送信し終えた時点での最も早いコマンドまでの余裕 [s], sendDuration: 送信にかかった時間 [s]
+ScheduleReport = namedtuple("ScheduleReport", ["sent", "late", "slack", "sendDuration"])
+
+
+# 時刻指定付きのコマンドをまとめて送るスケジューラ
+# コマンドは時刻順に並べてから1回の書き込みで送信し，送信し終えた時点で
+# 各コマンドの時刻までmargin秒以上の余裕があったかを確認する．
+#
+# clockは現在のデバイス時刻 [s] の見積もりを返す関数で，省略した場合はSimpleClient.deviceTimeUpperBoundを使う．
+# 見積もりが実際より進んでいる分には，遅れたコマンドを見逃すことはない．
+class TimedScheduler:
+    def __init__(self, usrp, margin=0.05, clock=None):
+        self.usrp = usrp
+        self.client = usrp.client
+        self.margin = margin
+        self.clock = clock if clock is not None else usrp.deviceTimeUpperBound
+        self.commands = []
+
+    def add(self, t, target, msg):
+        self.commands.append(ScheduledCommand(t, target, msg, False))
+
+    def addSetParam(self, t, target, key, value):
+        self.commands.append(ScheduledCommand(t, target, ezsdr.EzSDRClient.setParamMsg(key, value, ezsdr.onTime(t)), True))
+
+    # よく使うコマンド
+    def startTransmit(self, t, target="TX0"):
+        self.add(t, target, sigdatafmt.valueToBytes(0b00010001, np.uint8))
+
+    def stopTransmit(self, t, target="TX0"):
+        self.add(t, target, sigdatafmt.valueToBytes(0b00010010, np.uint8))
+
+    def startReceive(self, t, target="RX0"):
+        self.add(t, target, sigdatafmt.valueToBytes(0b00010001, np.uint8))
+
+    def stopReceive(self, t, target="RX0"):
+        self.add(t, target, sigdatafmt.valueToBytes(0b00010010, np.uint8))
+
+    def clear(self):
+        self.commands = []
+
+    # dropLateなら，送信前の時点ですでに間に合わないコマンドは送らずにlateとして報告する
+    def run(self, dropLate=False):
+        cmds = sorted(self.commands, key=lambda c: c.time)
+        self.commands = []
+
+        late = []
+        if dropLate:
+            now = self.clock()
+            late = [c for c in cmds if c.time - now < self.margin]
+            cmds = [c for c in cmds if c.time - now >= self.margin]
+
+        frames = []
+        for c in cmds:
+            if c.isDevice:
+                msg = c.msg
+            else:
+                qs = ezsdr.onTime(c.time)
+                msg = sigdatafmt.valueToBytes(len(qs), np.uint64) + qs + c.msg
+            frames.append(ezsdr.EzSDRClient.frameMsg(c.target, msg))
+
+        start = time.monotonic()
+        if len(frames) != 0:
+            self.client.sock.sendall(b"".join(frames))
+        sendDuration = time.monotonic() - start
+
+        now = self.clock()
+        late += [c for c in cmds if c.time - now < self.margin]
+        slack = (cmds[0].time - now) if len(cmds) != 0 else float("inf")
+        return ScheduleReport(cmds, late, slack, sendDuration)
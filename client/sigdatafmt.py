@@ -23,6 +23,95 @@ def readSignalFromSock(sock, size = None):
     return data;
 
 
+# 信号をやり取りするときのサンプル形式（名前 -> (サーバでの番号, 実部・虚部の型)）
+# sc16とsc8は 値 = 整数値 / scale で量子化される
+WIRE_FORMATS = {
+    "fc32": (0, np.float32),
+    "sc16": (1, np.int16),
+    "sc8":  (2, np.int8),
+}
+
+
+def wireFormatId(wireFormat):
+    return WIRE_FORMATS[wireFormat][0]
+
+
+def bytesPerSample(wireFormat):
+    return 2 * np.dtype(WIRE_FORMATS[wireFormat][1]).itemsize
+
+
+# signalsのピークが整数の最大値になるようなscale
+def autoScale(signals, wireFormat):
+    if wireFormat == "fc32":
+        return 1.0
+
+    peak = 0.0
+    for s in signals:
+        iq = np.asarray(s, dtype=np.complex64).view(np.float32)
+        peak = max(peak, float(np.max(np.abs(iq), initial=0)))
+
+    return float(np.iinfo(WIRE_FORMATS[wireFormat][1]).max / peak) if peak != 0 else 1.0
+
+
+# 信号をwireFormatの形式のバイト列に変換する
+# scaleが0ならピークが整数の最大値になるように決めて，(scale, バイト列)を返す
+def encodeSignal(signal, wireFormat, scale=0):
+    dtype = WIRE_FORMATS[wireFormat][1]
+    iq = np.ascontiguousarray(signal, dtype=np.complex64).view(np.float32)
+    if wireFormat == "fc32":
+        return 1.0, iq.tobytes()
+
+    info = np.iinfo(dtype)
+    if scale == 0:
+        scale = autoScale([signal], wireFormat)
+
+    q = np.rint(iq * np.float32(scale))
+    np.clip(q, info.min, info.max, out=q)
+    return scale, q.astype(dtype).tobytes()
+
+
+# wireFormatの形式の信号をソケットから読み，complex64の配列outに直接書き込む
+def readSignalFromSockInto(sock, out, wireFormat="fc32", scale=1.0):
+    assert out.dtype == np.complex64 and out.flags.c_contiguous
+    if wireFormat == "fc32":
+        readBytesFromSockInto(sock, out.view(np.uint8))
+        return out
+
+    raw = np.empty(2 * len(out), dtype=WIRE_FORMATS[wireFormat][1])
+    readBytesFromSockInto(sock, raw.view(np.uint8))
+    np.multiply(raw, np.float32(1 / scale), out=out.view(np.float32), casting="unsafe")
+    return out
+
+
+# 圧縮した送信信号のブロックの形式（名前 -> サーバでの番号）
+# "zlib-sc16"は，sc16のバイト列の下位バイトだけを並べた後に上位バイトを並べて，zlibで圧縮したもの
+WIRE_CODECS = {
+    "zlib-sc16": 0,
+}
+
+
+# signalをscaleでsc16に量子化し，blockLenサンプルごとに圧縮したブロックのリストを返す
+# zlibは圧縮中にGILを解放するので，poolにThreadPoolExecutorを渡すとブロックを並列に圧縮する
+def compressBlocks(signal, scale, blockLen, level=1, pool=None):
+    def work(k):
+        raw = np.frombuffer(encodeSignal(signal[k : k + blockLen], "sc16", scale)[1], dtype=np.uint8)
+        return zlib.compress(raw[0::2].tobytes() + raw[1::2].tobytes(), level)
+
+    starts = range(0, len(signal), blockLen)
+    return list(pool.map(work, starts)) if pool is not None else [work(k) for k in starts]
+
+
+# compressBlocksの逆変換
+def decompressBlocks(blocks, scale):
+    out = []
+    for b in blocks:
+        raw = np.frombuffer(zlib.decompress(b), dtype=np.uint8)
+        iq = np.empty(len(raw), dtype=np.uint8)
+        iq[0::2], iq[1::2] = raw[: len(raw) // 2], raw[len(raw) // 2 :]
+        out.append(iq.view(np.int16).astype(np.float32).view(np.complex64) / np.float32(scale))
+    return np.concatenate(out) if len(out) != 0 else np.empty(0, dtype=np.complex64)
+
+
 def valueToBytes(val, dtype):
     return np.array([val], dtype=dtype).tobytes()
 
@@ -37,6 +126,32 @@ def readInt32FromSock(sock):
 def readInt64FromSock(sock):
     return int.from_bytes(sock.recv(8), 'little');
 
+# ソケットからUInt8の値を読む
+def readUInt8FromSock(sock):
+    return int.from_bytes(readBytesFromSock(sock, 1), 'little');
+
+# ソケットからnバイトを読む（recvが途中までしか返さなくても，nバイト揃うまで待つ）
+def readBytesFromSock(sock, n):
+    data = bytearray(n)
+    readBytesFromSockInto(sock, data)
+    return data
+
+# ソケットからbufの長さ分のバイト列を読んでbufに書き込む
+def readBytesFromSockInto(sock, buf):
+    view = memoryview(buf).cast("B")
+    n = len(view)
+    pos = 0
+    while pos < n:
+        r = sock.recv_into(view[pos:], n - pos)
+        if r == 0:
+            raise ConnectionError("socket closed")
+        pos += r
+    return buf
+
+# ソケットからFloat32の値を読む
+def readFloat32FromSock(sock):
+    return float(np.frombuffer(readBytesFromSock(sock, 4), dtype=np.float32)[0])
+
 # ソケットにInt32の値を書き込む
 def writeInt32ToSock(sock, value):
     writeIntToSock(sock, value, np.uint32)
@@ -0,0 +1,94 @@
+import threading
+import time
+import numpy as np
+
+import ezsdr
+
+
+# 処理時間のヒストグラムhist（k番目は2^(k-1)以上2^k未満 [us]）から，割合qの分位点の上限 [s] を返す
+def latencyPercentile(hist, q):
+    total = sum(hist)
+    if total == 0:
+        return 0.0
+    cum = np.cumsum(hist)
+    k = int(np.searchsorted(cum, q * total))
+    return (2.0 ** k) * 1e-6
+
+
+# サーバの統計をバックグラウンドのスレッドでinterval秒ごとに取得して，(時刻 [s], 統計)の時系列にする
+# 受信や送信を止めないように，統計の取得には専用の接続を使う
+#
+#   with stats.ServerStatsPoller("127.0.0.1", 8888, interval=0.5) as poller:
+#       ... 実験 ...
+#   t, bps = poller.rates("RX0", "bytesOut")
+class ServerStatsPoller:
+    def __init__(self, ipaddr, port, interval=1.0, maxSamples=None):
+        self.client = ezsdr.EzSDRClient(ipaddr, port)
+        self.interval = interval
+        self.maxSamples = maxSamples    # 古いサンプルから捨てる（Noneなら捨てない）
+        self.samples = []
+        self.error = None               # 取得に失敗して止まった場合の例外
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self.client.__enter__()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.client.__exit__(None, None, None)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                stats = self.client.serverStats()
+            except Exception as ex:
+                self.error = ex
+                return
+
+            with self._lock:
+                self.samples.append((time.monotonic(), stats))
+                if self.maxSamples is not None and len(self.samples) > self.maxSamples:
+                    del self.samples[: len(self.samples) - self.maxSamples]
+
+            self._stop.wait(self.interval)
+
+    # これまでに取得した(時刻, 統計)のリスト
+    def series(self):
+        with self._lock:
+            return list(self.samples)
+
+    # サーバ全体の値keyの時系列を(時刻の配列, 値の配列)で返す
+    def values(self, key):
+        s = self.series()
+        return np.array([t for t, _ in s]), np.array([st[key] for _, st in s])
+
+    # 宛先targetの累計値key（"bytesIn", "bytesOut", "messages"）の1秒あたりの増加量を，
+    # 隣り合うサンプルの間ごとに(区間の終わりの時刻の配列, 増加量の配列)で返す
+    def rates(self, target, key="bytesOut"):
+        s = self.series()
+        t = np.array([st["uptime"] for _, st in s])
+        v = np.array([st["targets"][target][key] for _, st in s], dtype=np.float64)
+        return t[1:], np.diff(v) / np.diff(t)
+
+    # 宛先targetのサンプル間ごとの平均処理時間 [s]
+    def meanLatencies(self, target):
+        s = self.series()
+        n = np.array([st["targets"][target]["messages"] for _, st in s], dtype=np.float64)
+        usecs = np.array([st["targets"][target]["latencySumUsecs"] for _, st in s], dtype=np.float64)
+        dn = np.diff(n)
+        return np.where(dn > 0, np.diff(usecs) / np.maximum(dn, 1), 0.0) * 1e-6
@@ -0,0 +1,83 @@
+import json
+import itertools
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import ezsdr
+import sigdatafmt
+
+
+# params: このステップで設定したパラメータ, time: 設定した時刻 [s], result: process関数の戻り値（なければ受信信号）
+SweepPoint = namedtuple("SweepPoint", ["params", "time", "result"])
+
+
+# paramGrid(freq=[...], gain=[...]) のように，各キーの値の全組み合わせを辞書のリストで返す
+def paramGrid(**axes):
+    keys = list(axes.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*axes.values())]
+
+
+# 周波数やゲインなどを変えながら受信を繰り返す掃引
+# 各ステップでは，時刻t_kにパラメータを設定するsetParamと，時刻t_k + settle以降から受信する受信命令を
+# 返答を待たずに送る．サーバが次のステップの受信をしている間に，前のステップの受信信号をprocessで処理する．
+#
+# usrp: SimpleClient（syncを済ませておく）, devices: パラメータを設定するデバイス名のリスト
+# interval: ステップの間隔 [s]．設定の反映，settle，nsamplesの受信が収まる長さにする
+# process: process(params, signals)を処理スレッドで呼ぶ（Noneなら受信信号をそのまま返す）
+# clock: 現在のデバイス時刻 [s] の見積もりを返す関数（省略した場合はSimpleClient.deviceTimeUpperBoundで，syncが必要）
+class SweepEngine:
+    def __init__(self, usrp, devices, nsamples, interval, settle=0.01, lead=0.1, ridx=0, process=None, depth=2, clock=None):
+        self.usrp = usrp
+        self.devices = [devices] if isinstance(devices, str) else list(devices)
+        self.nsamples = nsamples
+        self.interval = interval
+        self.settle = settle
+        self.lead = lead
+        self.rx = usrp.rxs[ridx]
+        self.process = process
+        self.depth = depth              # 返答を待たずに送っておくステップ数
+        self.clock = clock if clock is not None else usrp.deviceTimeUpperBound
+        self.late = []                  # 送る時点ですでに設定時刻を過ぎていたステップの番号
+
+    def _sendStep(self, params, t):
+        client = self.usrp.client
+        frames = []
+        for dev in self.devices:
+            for key, value in params.items():
+                msg = ezsdr.EzSDRClient.setParamMsg(key, json.dumps(value), ezsdr.onTime(t))
+                frames.append(ezsdr.EzSDRClient.frameMsg(dev, msg))
+
+        qs = ezsdr.onTime(t + self.settle)
+        msg = sigdatafmt.valueToBytes(len(qs), np.uint64) + qs + self.rx.receiveRequestMsg(self.nsamples)
+        frames.append(ezsdr.EzSDRClient.frameMsg(self.rx.target, msg))
+        client.sock.sendall(b"".join(frames))
+        client.expectResponses(1)
+
+    # gridの各点を順に掃引して，SweepPointのリストを返す
+    def run(self, grid):
+        grid = list(grid)
+        self.late = []
+        t0 = self.clock() + self.lead
+        times = [t0 + k * self.interval for k in range(len(grid))]
+
+        def send(k):
+            if times[k] < self.clock():
+                self.late.append(k)
+            self._sendStep(grid[k], times[k])
+
+        def work(params, signals):
+            return signals if self.process is None else self.process(params, signals)
+
+        nsent = 0
+        futures = []
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            for k in range(len(grid)):
+                while nsent < min(k + self.depth, len(grid)):
+                    send(nsent)
+                    nsent += 1
+
+                signals = self.rx.receiveResponseOnly()
+                futures.append(pool.submit(work, grid[k], signals))
+
+            return [SweepPoint(grid[k], times[k], f.result()) for k, f in enumerate(futures)]
@@ -28,6 +28,24 @@ struct  CommandTimeInfo
 #pragma pack(pop)
 
 
+#pragma pack(push,1)
+struct ReceiveTimeInfo
+{
+    static const uint32_t tag = 0x5C45D2C7;
+    uint64_t nsecs;
+};
+#pragma pack(pop)
+
+
+#pragma pack(push,1)
+struct SampleIndexInfo
+{
+    static const uint32_t tag = 0x4ABD085D;
+    int64_t index;
+};
+#pragma pack(pop)
+
+
 #pragma pack(push,1)
 struct USRPStreamerChannelInfo
 {
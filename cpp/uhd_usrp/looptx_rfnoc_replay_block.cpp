@@ -43,6 +43,7 @@ struct Device
 
     uint32_t replay_buff_addr;
     uint32_t replay_buff_size;
+    bool is_playing;
 
     bool has_time_spec;
     uhd::time_spec_t time_spec;
@@ -77,7 +78,7 @@ DeviceHandler setupDevice(
     auto cpu_format = "fc32";
     auto wire_format = "sc16";
 
-    Device* dev = new Device;
+    Device* dev = new Device();
     dev->config = config;
     dev->args = args;
     dev->tx_args = tx_args;
@@ -248,7 +249,28 @@ void destroyDevice(DeviceHandler& handler)
 }
 
 
+uint64_t setTransmitSignalAt(DeviceHandler handler, void const* const* signals, uint64_t sample_size, uint64_t num_samples, uint64_t addr);
+
+
+uint64_t getMemorySize(DeviceHandler handler)
+{
+    Device* dev = handler.dev;
+    return dev->replay_ctrl->get_mem_size();
+}
+
+
 uint64_t setTransmitSignal(DeviceHandler handler, void const* const* signals, uint64_t sample_size, uint64_t num_samples)
+{
+    Device* dev = handler.dev;
+    uint64_t num_recorded = setTransmitSignalAt(handler, signals, sample_size, num_samples, 0);
+    dev->replay_buff_addr = 0;
+    dev->replay_buff_size = num_samples * sample_size;
+    return num_recorded;
+}
+
+
+// DRAMのaddrから信号を書き込む．再生中の領域と重ならなければ，再生を止めずに書き込める
+uint64_t setTransmitSignalAt(DeviceHandler handler, void const* const* signals, uint64_t sample_size, uint64_t num_samples, uint64_t addr)
 {
     Device* dev = handler.dev;
     const size_t replay_word_size = dev->replay_ctrl->get_word_size(); // Size of words used by replay block
@@ -260,15 +282,13 @@ uint64_t setTransmitSignal(DeviceHandler handler, void const* const* signals, ui
     /************************************************************************
      * Configure replay block
      ***********************************************************************/
-    // Configure a buffer in the on-board memory at address 0 that's equal in
+    // Configure a buffer in the on-board memory at address addr that's equal in
     // size to the file we want to play back (rounded down to a multiple of
     // 64-bit words). Note that it is allowed to playback a different size or
     // location from what was recorded.
-    uint32_t replay_buff_addr = 0;
+    uint32_t replay_buff_addr = addr;
     uint32_t replay_buff_size = samples_to_replay * sample_size;
     dev->replay_ctrl->record(replay_buff_addr, replay_buff_size, dev->replay_chan);
-    dev->replay_buff_addr = replay_buff_addr;
-    dev->replay_buff_size = replay_buff_size;
 
     // Display replay configuration
     std::cout << "Replay file size:     " << replay_buff_size << " bytes (" << words_to_replay
@@ -334,6 +354,49 @@ uint64_t setTransmitSignal(DeviceHandler handler, void const* const* signals, ui
 
 
 
+// DRAMのaddrへ信号を書き込むだけの軽量版．部分的な書き換えで使う
+// 直前の書き込みは記録の完了まで待っているので入力側に残りはなく，setTransmitSignalAtのような空読み（最低250ms）やログ出力はしない
+static bool writeTransmitSignalAt(Device* dev, void const* const* signals, uint64_t sample_size, uint64_t num_samples, uint64_t addr)
+{
+    const uint64_t num_bytes = num_samples * sample_size;
+    dev->replay_ctrl->record(addr, num_bytes, dev->replay_chan);
+
+    uhd::tx_metadata_t tx_md;
+    tx_md.start_of_burst = true;
+    tx_md.end_of_burst   = true;
+    size_t num_tx_samps = dev->streamer->send(signals[0], num_samples, tx_md, std::max(1.0, num_samples/dev->rate*100));
+    if (num_tx_samps != num_samples)
+        return false;
+
+    while (dev->replay_ctrl->get_record_fullness(dev->replay_chan) < num_bytes) {
+        std::this_thread::sleep_for(1ms);
+    }
+
+    return true;
+}
+
+
+// 再生中の信号のsample_offsetサンプル目からを書き換える
+// リプレイブロックのワード境界に揃っていない場合は何もせずにfalseを返す
+bool patchTransmitSignal(DeviceHandler handler, void const* const* signals, uint64_t sample_size, uint64_t num_samples, uint64_t sample_offset)
+{
+    Device* dev = handler.dev;
+    const uint64_t word_size = dev->replay_ctrl->get_word_size();
+    const uint64_t offset_bytes = sample_offset * sample_size;
+    const uint64_t patch_bytes = num_samples * sample_size;
+
+    if(offset_bytes % word_size != 0 || patch_bytes % word_size != 0)
+        return false;
+
+    if(offset_bytes + patch_bytes > dev->replay_buff_size)
+        return false;
+
+    // 再生とは独立に書き込めるので，再生は止めない
+    return writeTransmitSignalAt(dev, signals, sample_size, num_samples, dev->replay_buff_addr + offset_bytes);
+}
+
+
+
 void startTransmit(DeviceHandler handler)
 {
     Device* dev = handler.dev;
@@ -346,6 +409,7 @@ void startTransmit(DeviceHandler handler)
     dev->replay_ctrl->play(dev->replay_buff_addr, dev->replay_buff_size, dev->replay_chan, time_spec, repeat);
 
     dev->has_time_spec = false;
+    dev->is_playing = true;
 }
 
 
@@ -354,6 +418,21 @@ void stopTransmit(DeviceHandler handler)
     Device* dev = handler.dev;
 
     dev->replay_ctrl->stop(dev->replay_chan);
+    dev->is_playing = false;
+}
+
+
+// DRAMに書き込み済みの領域を送信信号にする．再生中であれば新しい領域で再生し直す
+void selectTransmitSignal(DeviceHandler handler, uint64_t addr, uint64_t size)
+{
+    Device* dev = handler.dev;
+    dev->replay_buff_addr = addr;
+    dev->replay_buff_size = size;
+
+    if(dev->is_playing) {
+        stopTransmit(handler);
+        startTransmit(handler);
+    }
 }
 
 
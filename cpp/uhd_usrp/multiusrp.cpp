@@ -554,5 +554,16 @@ uint64_t continuousReceiveImpl(RxStreamerHandler handler, void** buffptr, uint64
 }
 
 
+bool lastReceiveTimeImpl(RxStreamerHandler handler, uint64_t& nsecs)
+{
+    uhd::rx_metadata_t const& md = handler.streamer->md;
+    if(!md.has_time_spec)
+        return false;
+
+    nsecs = md.time_spec.to_ticks(1e9);
+    return true;
+}
+
+
 
 }